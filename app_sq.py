@@ -1,5 +1,6 @@
 import json
 import pandas as pd
+from dataclasses import asdict
 import streamlit as st
 from datetime import datetime, timedelta
 from PIL import Image
@@ -14,7 +15,7 @@ except Exception as e:
     print(f"Warning: Could not load .env file: {e}")
 
 # Import our custom modules
-from database import DatabaseManager
+from database import DatabaseManager, hash_password, verify_password
 from cloud_compatible import CloudCompatibleDatabaseManager
 from auth import AuthManager, render_auth_ui
 from planner import Recipe, make_week_plan, build_shopping_list, DAYS
@@ -45,8 +46,8 @@ def get_db_manager():
     try:
         # Try to use regular database first (for local development)
         db_manager = DatabaseManager()
-        # Test if we can write to the database
-        db_manager.save_meal_plan(1, {"test": "data"}, datetime.now())
+        # Test if we can write to the database without touching user data
+        db_manager.check_writable()
         return db_manager
     except Exception as e:
         # If database write fails (like on Streamlit Cloud), use cloud-compatible version
@@ -171,7 +172,7 @@ def render_meal_planning_page(user, db_manager):
             enriched_recipe = enrich_recipe_with_portions(r)
             merged.append(enriched_recipe)
             
-        return [Recipe(**r) for r in merged]
+        return [Recipe.from_dict(r) for r in merged]
     
     recipes = load_recipes()
     
@@ -335,7 +336,7 @@ def render_meal_planning_page(user, db_manager):
         for day, meals in plan.items():
             for meal_type, recipe in meals.items():
                 if recipe:
-                    adapted_recipe = skill_adapter.adapt_recipe_for_skill(recipe.model_dump(), cooking_skill)
+                    adapted_recipe = skill_adapter.adapt_recipe_for_skill(asdict(recipe), cooking_skill)
                     # Update the recipe with adapted version (only existing fields)
                     valid_fields = ['name', 'meal_type', 'kcal', 'protein', 'carbs', 'fat', 'tags', 'ingredients', 'steps']
                     for key, value in adapted_recipe.items():
@@ -350,7 +351,7 @@ def render_meal_planning_page(user, db_manager):
             plan_data[day] = {}
             for meal_type, recipe in meals.items():
                 if recipe:
-                    plan_data[day][meal_type] = recipe.model_dump()
+                    plan_data[day][meal_type] = asdict(recipe)
                 else:
                     plan_data[day][meal_type] = None
         
@@ -453,7 +454,7 @@ def render_meal_planning_page(user, db_manager):
                         # Save AI-generated recipes
                         if use_ai_expand and r and "AI" in getattr(r, "tags", []):
                             if st.button(f"💾 Ruaj recetën: {recipe_name}", key=f"save_{day}_{meal_type}"):
-                                saved = save_recipe_to_json(r.model_dump())
+                                saved = save_recipe_to_json(asdict(r))
                                 if saved:
                                     st.success("✅ Receta u ruajt në recipes.json!")
                                 else:
@@ -470,8 +471,10 @@ def render_meal_planning_page(user, db_manager):
         # Add Herbalife products to shopping list if integrated
         if use_herbalife:
             herbalife_integration = HerbalifeIntegration(db_manager)
-            herbalife_plan = herbalife_integration.create_herbalife_meal_plan(user.id, goal, total_kcal, pattern)
-            herbalife_shopping = herbalife_integration.get_herbalife_shopping_list(herbalife_plan)
+            herbalife_plan = herbalife_integration.create_herbalife_meal_plan(
+                user.id, goal, total_kcal, pattern
+            )
+            herbalife_shopping, herbalife_nutrition = herbalife_integration.summarize_plan(herbalife_plan)
             
             # Merge Herbalife products into shopping list
             for product, count in herbalife_shopping.items():
@@ -492,7 +495,6 @@ def render_meal_planning_page(user, db_manager):
         # Show Herbalife nutrition summary if integrated
         if use_herbalife:
             st.subheader("🥤 Përmbledhje Nutritive Herbalife")
-            herbalife_nutrition = herbalife_integration.calculate_herbalife_nutrition(herbalife_plan)
             
             col1, col2, col3, col4 = st.columns(4)
             with col1:
@@ -608,6 +610,7 @@ def render_settings_page(user, db_manager, lang="sq"):
             
             conn.commit()
             conn.close()
+            db_manager.invalidate_user_cache(user.id)
             
             st.success("Profili u përditësua me sukses!")
             st.rerun()
@@ -653,6 +656,7 @@ def render_settings_page(user, db_manager, lang="sq"):
             
             conn.commit()
             conn.close()
+            db_manager.invalidate_user_cache(user.id)
             
             st.success("Preferencat u përditësuan me sukses!")
             st.rerun()
@@ -695,9 +699,6 @@ def render_settings_page(user, db_manager, lang="sq"):
                         st.error("Fjalëkalimi i ri duhet të ketë të paktën 6 karaktere")
                     else:
                         # Verify current password by getting it from database
-                        import hashlib
-                        current_hash = hashlib.sha256(current_password.encode()).hexdigest()
-                        
                         conn = db_manager.db_path
                         import sqlite3
                         conn = sqlite3.connect(conn)
@@ -707,11 +708,11 @@ def render_settings_page(user, db_manager, lang="sq"):
                         cursor.execute('SELECT password_hash FROM users WHERE id = ?', (user.id,))
                         stored_hash = cursor.fetchone()[0]
                         
-                        if current_hash != stored_hash:
+                        if not verify_password(current_password, stored_hash):
                             st.error("Fjalëkalimi aktual është i gabuar")
                         else:
                             # Update password
-                            new_hash = hashlib.sha256(new_password.encode()).hexdigest()
+                            new_hash = hash_password(new_password)
                             
                             cursor.execute('''
                                 UPDATE users SET password_hash = ? WHERE id = ?
@@ -750,9 +751,6 @@ def render_settings_page(user, db_manager, lang="sq"):
                         st.error("Ju lutem shkruani fjalëkalimin për konfirmim")
                     else:
                         # Verify password by getting it from database
-                        import hashlib
-                        password_hash = hashlib.sha256(password_confirm.encode()).hexdigest()
-                        
                         conn = db_manager.db_path
                         import sqlite3
                         conn = sqlite3.connect(conn)
@@ -762,26 +760,16 @@ def render_settings_page(user, db_manager, lang="sq"):
                         cursor.execute('SELECT password_hash FROM users WHERE id = ?', (user.id,))
                         stored_hash = cursor.fetchone()[0]
                         
-                        if password_hash != stored_hash:
+                        if not verify_password(password_confirm, stored_hash):
                             st.error("Fjalëkalimi është i gabuar")
                             conn.close()
                         else:
-                            # Delete account and all related data
-                            
-                            # Delete all user data
-                            cursor.execute('DELETE FROM user_profiles WHERE user_id = ?', (user.id,))
-                            cursor.execute('DELETE FROM user_preferences WHERE user_id = ?', (user.id,))
-                            cursor.execute('DELETE FROM nutrition_reports WHERE user_id = ?', (user.id,))
-                            cursor.execute('DELETE FROM meal_plans WHERE user_id = ?', (user.id,))
-                            cursor.execute('DELETE FROM user_achievements WHERE user_id = ?', (user.id,))
-                            cursor.execute('DELETE FROM user_challenges WHERE user_id = ?', (user.id,))
-                            cursor.execute('DELETE FROM food_recognition_logs WHERE user_id = ?', (user.id,))
-                            cursor.execute('DELETE FROM analytics_events WHERE user_id = ?', (user.id,))
-                            cursor.execute('DELETE FROM users WHERE id = ?', (user.id,))
-                            
-                            conn.commit()
                             conn.close()
                             
+                            # Delete account and all related data
+                            db_manager.delete_user(user.id)
+                            st.cache_data.clear()  # cached preferences, reports and challenges may hold the user's data
+                            
                             st.success("Llogaria u fshi me sukses!")
                             st.session_state.show_delete_account = False
                             st.session_state.authenticated = False
@@ -874,7 +862,7 @@ def integrate_herbalife_into_plan(regular_plan: Dict, herbalife_plan: Dict, goal
                     }
                     
                     # Create Recipe object
-                    integrated_recipe = Recipe(**integrated_recipe_data)
+                    integrated_recipe = Recipe.from_dict(integrated_recipe_data)
                     
                     day_plan[meal_type] = integrated_recipe
                 else:
@@ -897,7 +885,7 @@ def integrate_herbalife_into_plan(regular_plan: Dict, herbalife_plan: Dict, goal
                     }
                     
                     # Create Recipe object
-                    herbalife_recipe = Recipe(**herbalife_recipe_data)
+                    herbalife_recipe = Recipe.from_dict(herbalife_recipe_data)
                     
                     day_plan[meal_type] = herbalife_recipe
             else:
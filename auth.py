@@ -1,9 +1,8 @@
 import streamlit as st
 import json
-import hashlib
 import secrets
 from typing import Optional, Dict, Any
-from database import DatabaseManager, User
+from database import DatabaseManager, User, verify_password
 import os
 from datetime import datetime
 
@@ -81,10 +80,9 @@ class AuthManager:
             return False
         
         # Verify password
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
         stored_hash = self._get_password_hash(user.id)
         
-        if password_hash != stored_hash:
+        if not verify_password(password, stored_hash):
             return False
         
         self._set_user_session(user)
@@ -193,6 +191,7 @@ class AuthManager:
             
             conn.commit()
             conn.close()
+            self.db.invalidate_user_cache(user_id)
         except Exception as e:
             # If database update fails (like on Streamlit Cloud), just skip it
             pass
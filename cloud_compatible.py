@@ -75,6 +75,15 @@ class CloudCompatibleStorage:
         
         return st.session_state.analytics_events[user_id][-limit:]
     
+    @staticmethod
+    def count_analytics_events(user_id: int, event_type: str) -> int:
+        """Count stored analytics events of one type from session state"""
+        if 'analytics_events' not in st.session_state:
+            return 0
+        
+        events = st.session_state.analytics_events.get(user_id, [])
+        return sum(1 for event in events if event['event_type'] == event_type)
+    
     @staticmethod
     def save_user_preferences(user_id: int, preferences: Dict) -> None:
         """Save user preferences to session state"""
@@ -122,6 +131,53 @@ class CloudCompatibleStorage:
             return []
         
         return st.session_state.achievements.get(user_id, [])
+    
+    @staticmethod
+    def get_cached_recognition(image_hash: str) -> Optional[Dict]:
+        """Get a cached food recognition result from session state"""
+        if 'recognition_cache' not in st.session_state:
+            return None
+        
+        return st.session_state.recognition_cache.get(image_hash)
+    
+    @staticmethod
+    def cache_recognition(image_hash: str, result: Dict) -> None:
+        """Cache a food recognition result in session state"""
+        if 'recognition_cache' not in st.session_state:
+            st.session_state.recognition_cache = {}
+        
+        st.session_state.recognition_cache[image_hash] = result
+        
+        # Keep only the 50 most recently cached results
+        while len(st.session_state.recognition_cache) > 50:
+            del st.session_state.recognition_cache[next(iter(st.session_state.recognition_cache))]
+    
+    @staticmethod
+    def log_food_recognition(user_id: int, recognized_foods: List[str], confidence_scores: List[int]) -> None:
+        """Log food recognition results to session state"""
+        if 'food_recognition_logs' not in st.session_state:
+            st.session_state.food_recognition_logs = {}
+        
+        if user_id not in st.session_state.food_recognition_logs:
+            st.session_state.food_recognition_logs[user_id] = []
+        
+        st.session_state.food_recognition_logs[user_id].append({
+            'recognized_foods': recognized_foods,
+            'confidence_scores': confidence_scores,
+            'created_at': datetime.now()
+        })
+        
+        # Keep only last 50 recognitions
+        if len(st.session_state.food_recognition_logs[user_id]) > 50:
+            st.session_state.food_recognition_logs[user_id] = st.session_state.food_recognition_logs[user_id][-50:]
+    
+    @staticmethod
+    def get_food_recognition_logs(user_id: int, limit: int = 20) -> List[Dict]:
+        """Get food recognition logs from session state, newest first"""
+        if 'food_recognition_logs' not in st.session_state:
+            return []
+        
+        return st.session_state.food_recognition_logs.get(user_id, [])[::-1][:limit]
 
 class CloudCompatibleDatabaseManager:
     """Cloud-compatible database manager that uses session state"""
@@ -146,13 +202,20 @@ class CloudCompatibleDatabaseManager:
         """Get analytics events using cloud-compatible storage"""
         return self.storage.get_analytics_events(user_id, limit)
     
+    def count_analytics_events(self, user_id: int, event_type: str) -> int:
+        """Count analytics events of one type using cloud-compatible storage"""
+        return self.storage.count_analytics_events(user_id, event_type)
+    
     def save_user_preferences(self, user_id: int, preferences: Dict) -> None:
         """Save user preferences using cloud-compatible storage"""
         self.storage.save_user_preferences(user_id, preferences)
     
-    def get_user_preferences(self, user_id: int) -> Dict:
+    def get_user_preferences(self, user_id: int, limit: Optional[int] = None) -> Dict:
         """Get user preferences using cloud-compatible storage"""
-        return self.storage.get_user_preferences(user_id)
+        preferences = self.storage.get_user_preferences(user_id)
+        if limit is None:
+            return preferences
+        return dict(list(preferences.items())[:limit])
     
     def save_cooking_skills(self, user_id: int, skills: Dict) -> None:
         """Save cooking skills using cloud-compatible storage"""
@@ -162,6 +225,11 @@ class CloudCompatibleDatabaseManager:
         """Get cooking skills using cloud-compatible storage"""
         return self.storage.get_cooking_skills(user_id)
     
+    def update_cooking_skill(self, user_id: int, skill_level: str) -> None:
+        """Update cooking skill level using cloud-compatible storage"""
+        skills = self.storage.get_cooking_skills(user_id)
+        self.storage.save_cooking_skills(user_id, {**skills, 'level': skill_level})
+    
     def save_achievements(self, user_id: int, achievements: List[str]) -> None:
         """Save achievements using cloud-compatible storage"""
         self.storage.save_achievements(user_id, achievements)
@@ -170,6 +238,36 @@ class CloudCompatibleDatabaseManager:
         """Get achievements using cloud-compatible storage"""
         return self.storage.get_achievements(user_id)
     
+    def get_cached_recognition(self, image_hash: str) -> Optional[Dict]:
+        """Get a cached food recognition result using cloud-compatible storage"""
+        return self.storage.get_cached_recognition(image_hash)
+    
+    def cache_recognition(self, image_hash: str, result: Dict) -> None:
+        """Cache a food recognition result using cloud-compatible storage"""
+        self.storage.cache_recognition(image_hash, result)
+    
+    def log_food_recognition(self, user_id: int, recognized_foods: List[str], confidence_scores: List[int]) -> None:
+        """Log food recognition results and their analytics event using cloud-compatible storage"""
+        self.storage.log_food_recognition(user_id, recognized_foods, confidence_scores)
+        self.storage.log_analytics_event(user_id, 'food_recognition', {
+            'recognized_foods': recognized_foods,
+            'confidence_scores': confidence_scores
+        })
+    
+    def get_food_recognition_logs(self, user_id: int, limit: int = 20) -> List[Dict]:
+        """Get food recognition logs using cloud-compatible storage"""
+        return self.storage.get_food_recognition_logs(user_id, limit)
+    
+    def delete_user(self, user_id: int) -> None:
+        """Delete all of a user's data from session state"""
+        for key in ('meal_plans', 'analytics_events', 'user_preferences', 'cooking_skills',
+                    'achievements', 'food_recognition_logs'):
+            st.session_state.get(key, {}).pop(user_id, None)
+    
+    def invalidate_user_cache(self, user_id: int) -> None:
+        """No-op: cloud users are rebuilt from session storage on every read"""
+        pass
+    
     def get_user_by_id(self, user_id: int) -> Optional[Any]:
         """Get user by ID - returns a mock user for cloud compatibility"""
         from database import User
@@ -2,6 +2,99 @@ import streamlit as st
 from typing import Dict, List, Optional
 from database import DatabaseManager
 import json
+import re
+from enum import IntEnum
+
+class Skill(IntEnum):
+    """Cooking skill levels, ordered from least to most experienced"""
+    BEGINNER = 0
+    INTERMEDIATE = 1
+    ADVANCED = 2
+
+_SKILL_FROM_STR = {
+    'beginner': Skill.BEGINNER,
+    'intermediate': Skill.INTERMEDIATE,
+    'advanced': Skill.ADVANCED,
+}
+
+# Base prep time in minutes, indexed by Skill
+_BASE_PREP_MINUTES = (45, 30, 20)
+
+def _recipe_complexity(recipe: Dict) -> float:
+    """Complexity factor from ingredient and step counts"""
+    return (len(recipe.get('ingredients', [])) + len(recipe.get('steps', []))) / 10
+
+# Beginner step hints in priority order: keyword -> (instruction prefix, plain-language replacement)
+_STEP_HINTS = {
+    'sauté': ("Heat a pan over medium heat.", 'cook while stirring occasionally'),
+    'simmer': ("Bring to a gentle boil, then reduce heat.", 'let it bubble gently'),
+    'bake': ("Preheat your oven first.", 'cook in the oven'),
+    'season': ("Add salt, pepper, and any other spices.", None),
+}
+_STEP_PRIORITY = {keyword: i for i, keyword in enumerate(_STEP_HINTS)}
+_STEP_RE = re.compile('|'.join(_STEP_HINTS), re.IGNORECASE)
+
+def _match_case(replacement: str, word: str) -> str:
+    """Capitalize the replacement when the word it replaces was capitalized"""
+    return replacement[0].upper() + replacement[1:] if word[0].isupper() else replacement
+
+# Ingredient keywords that trigger recipe-specific tips, matched in a single scan
+_TIP_KEYWORDS_RE = re.compile(r'chicken|pasta|rice|fish|vegetables|meat|sauce')
+
+def _ingredient_keywords(recipe: Dict) -> set:
+    """Return the tip keywords found in a recipe's ingredients"""
+    joined = " ".join(ing.lower() for ing in recipe.get('ingredients', []))
+    return set(_TIP_KEYWORDS_RE.findall(joined))
+
+# Static tips shared by every recipe at a given skill level
+_GENERAL_BEGINNER_TIPS = (
+    "Read through all steps before starting",
+    "Prepare all ingredients before cooking",
+    "Keep a clean workspace",
+)
+
+_GENERAL_INTERMEDIATE_TIPS = (
+    "Taste and adjust seasoning as you cook",
+    "Let meat rest before cutting",
+    "Use a meat thermometer for accuracy",
+)
+
+_GENERAL_ADVANCED_TECHNIQUES = (
+    "Master the art of seasoning and layering flavors",
+    "Experiment with different cooking methods",
+    "Develop your own variations and improvements",
+)
+
+_GENERAL_VARIATIONS = (
+    "Try different protein sources",
+    "Experiment with different cuisines",
+    "Add your own creative twists",
+)
+
+# Indexed by Skill
+_SKILL_RECOMMENDATIONS = (
+    (
+        "Start with simple one-pot meals",
+        "Learn basic knife skills",
+        "Practice with eggs (scrambled, fried, boiled)",
+        "Master rice and pasta cooking",
+        "Learn to season food properly",
+    ),
+    (
+        "Try more complex techniques like braising",
+        "Experiment with different cuisines",
+        "Learn to make your own stocks and sauces",
+        "Practice timing multiple dishes",
+        "Develop your palate and taste testing skills",
+    ),
+    (
+        "Master advanced techniques like sous vide",
+        "Create your own recipes",
+        "Learn about food science and chemistry",
+        "Experiment with fermentation",
+        "Teach others to cook",
+    ),
+)
 
 class CookingSkillAdapter:
     def __init__(self, db_manager: DatabaseManager):
@@ -16,32 +109,18 @@ class CookingSkillAdapter:
     
     def update_skill_level(self, user_id: int, skill_level: str):
         """Update user's cooking skill level"""
-        conn = self.db.db_path
-        import sqlite3
-        conn = sqlite3.connect(conn)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE users SET cooking_skill = ? WHERE id = ?
-        ''', (skill_level, user_id))
-        
-        conn.commit()
-        conn.close()
+        self.db.update_cooking_skill(user_id, skill_level)
     
     def adapt_recipe_for_skill(self, recipe: Dict, skill_level: str) -> Dict:
         """Adapt recipe based on user's cooking skill level"""
-        adapted_recipe = recipe.copy()
+        skill = _SKILL_FROM_STR.get(skill_level)
+        if skill is None:
+            return recipe.copy()
         
-        if skill_level == 'beginner':
-            adapted_recipe = self._adapt_for_beginner(adapted_recipe)
-        elif skill_level == 'intermediate':
-            adapted_recipe = self._adapt_for_intermediate(adapted_recipe)
-        elif skill_level == 'advanced':
-            adapted_recipe = self._adapt_for_advanced(adapted_recipe)
-        
-        return adapted_recipe
+        adapters = (self._adapt_for_beginner, self._adapt_for_intermediate, self._adapt_for_advanced)
+        return adapters[skill](recipe.copy(), _recipe_complexity(recipe))
     
-    def _adapt_for_beginner(self, recipe: Dict) -> Dict:
+    def _adapt_for_beginner(self, recipe: Dict, complexity: float) -> Dict:
         """Adapt recipe for beginner cooks"""
         adapted = recipe.copy()
         
@@ -70,11 +149,11 @@ class CookingSkillAdapter:
         adapted['ingredients'] = simplified_ingredients
         
         # Add prep time estimate
-        adapted['prep_time'] = self._estimate_prep_time(recipe, 'beginner')
+        adapted['prep_time'] = self._estimate_prep_time(complexity, Skill.BEGINNER)
         
         return adapted
     
-    def _adapt_for_intermediate(self, recipe: Dict) -> Dict:
+    def _adapt_for_intermediate(self, recipe: Dict, complexity: float) -> Dict:
         """Adapt recipe for intermediate cooks"""
         adapted = recipe.copy()
         
@@ -82,11 +161,11 @@ class CookingSkillAdapter:
         adapted['intermediate_tips'] = self._get_intermediate_tips(recipe)
         
         # Add prep time estimate
-        adapted['prep_time'] = self._estimate_prep_time(recipe, 'intermediate')
+        adapted['prep_time'] = self._estimate_prep_time(complexity, Skill.INTERMEDIATE)
         
         return adapted
     
-    def _adapt_for_advanced(self, recipe: Dict) -> Dict:
+    def _adapt_for_advanced(self, recipe: Dict, complexity: float) -> Dict:
         """Adapt recipe for advanced cooks"""
         adapted = recipe.copy()
         
@@ -95,23 +174,24 @@ class CookingSkillAdapter:
         adapted['variations'] = self._get_recipe_variations(recipe)
         
         # Add prep time estimate
-        adapted['prep_time'] = self._estimate_prep_time(recipe, 'advanced')
+        adapted['prep_time'] = self._estimate_prep_time(complexity, Skill.ADVANCED)
         
         return adapted
     
     def _simplify_step(self, step: str) -> str:
         """Simplify a cooking step for beginners"""
-        # Add more specific instructions
-        if 'sauté' in step.lower():
-            return f"Heat a pan over medium heat. {step.replace('sauté', 'cook while stirring occasionally')}"
-        elif 'simmer' in step.lower():
-            return f"Bring to a gentle boil, then reduce heat. {step.replace('simmer', 'let it bubble gently')}"
-        elif 'bake' in step.lower():
-            return f"Preheat your oven first. {step.replace('bake', 'cook in the oven')}"
-        elif 'season' in step.lower():
-            return f"Add salt, pepper, and any other spices. {step}"
-        else:
+        # Add more specific instructions for the highest-priority technique mentioned
+        keyword = min((m.group(0).lower() for m in _STEP_RE.finditer(step)), key=_STEP_PRIORITY.get, default=None)
+        if keyword is None:
             return step
+        
+        prefix, replacement = _STEP_HINTS[keyword]
+        if replacement:
+            step = _STEP_RE.sub(
+                lambda m: _match_case(replacement, m.group(0)) if m.group(0).lower() == keyword else m.group(0),
+                step
+            )
+        return f"{prefix} {step}"
     
     def _simplify_ingredient(self, ingredient: str) -> str:
         """Simplify ingredient description for beginners"""
@@ -127,69 +207,56 @@ class CookingSkillAdapter:
     
     def _get_beginner_tips(self, recipe: Dict) -> List[str]:
         """Get beginner cooking tips for a recipe"""
-        tips = []
-        
         # General beginner tips
-        tips.append("Read through all steps before starting")
-        tips.append("Prepare all ingredients before cooking")
-        tips.append("Keep a clean workspace")
+        tips = list(_GENERAL_BEGINNER_TIPS)
         
         # Recipe-specific tips
-        if any('chicken' in ing.lower() for ing in recipe.get('ingredients', [])):
+        keywords = _ingredient_keywords(recipe)
+        if 'chicken' in keywords:
             tips.append("Chicken is done when juices run clear")
         
-        if any('pasta' in ing.lower() for ing in recipe.get('ingredients', [])):
+        if 'pasta' in keywords:
             tips.append("Test pasta by tasting - it should be al dente")
         
-        if any('rice' in ing.lower() for ing in recipe.get('ingredients', [])):
+        if 'rice' in keywords:
             tips.append("Use a 2:1 ratio of water to rice")
         
         return tips
     
     def _get_intermediate_tips(self, recipe: Dict) -> List[str]:
         """Get intermediate cooking tips for a recipe"""
-        tips = []
-        
         # General intermediate tips
-        tips.append("Taste and adjust seasoning as you cook")
-        tips.append("Let meat rest before cutting")
-        tips.append("Use a meat thermometer for accuracy")
+        tips = list(_GENERAL_INTERMEDIATE_TIPS)
         
         # Recipe-specific tips
-        if any('fish' in ing.lower() for ing in recipe.get('ingredients', [])):
+        keywords = _ingredient_keywords(recipe)
+        if 'fish' in keywords:
             tips.append("Fish is done when it flakes easily with a fork")
         
-        if any('vegetables' in ing.lower() for ing in recipe.get('ingredients', [])):
+        if 'vegetables' in keywords:
             tips.append("Cut vegetables uniformly for even cooking")
         
         return tips
     
     def _get_advanced_techniques(self, recipe: Dict) -> List[str]:
         """Get advanced cooking techniques for a recipe"""
-        techniques = []
-        
         # General advanced techniques
-        techniques.append("Master the art of seasoning and layering flavors")
-        techniques.append("Experiment with different cooking methods")
-        techniques.append("Develop your own variations and improvements")
+        techniques = list(_GENERAL_ADVANCED_TECHNIQUES)
         
         # Recipe-specific techniques
-        if any('meat' in ing.lower() for ing in recipe.get('ingredients', [])):
+        keywords = _ingredient_keywords(recipe)
+        if 'meat' in keywords:
             techniques.append("Try sous vide for perfect doneness")
         
-        if any('sauce' in ing.lower() for ing in recipe.get('ingredients', [])):
+        if 'sauce' in keywords:
             techniques.append("Learn to make mother sauces and derivatives")
         
         return techniques
     
     def _get_recipe_variations(self, recipe: Dict) -> List[str]:
         """Get recipe variations for advanced cooks"""
-        variations = []
-        
         # General variations
-        variations.append("Try different protein sources")
-        variations.append("Experiment with different cuisines")
-        variations.append("Add your own creative twists")
+        variations = list(_GENERAL_VARIATIONS)
         
         # Recipe-specific variations
         if 'pasta' in recipe.get('name', '').lower():
@@ -202,56 +269,53 @@ class CookingSkillAdapter:
         
         return variations
     
-    def _estimate_prep_time(self, recipe: Dict, skill_level: str) -> str:
+    def _estimate_prep_time(self, complexity: float, skill: Skill) -> str:
         """Estimate prep time based on skill level"""
-        base_time = 30  # Base time in minutes
-        
-        # Adjust based on skill level
-        if skill_level == 'beginner':
-            base_time += 15  # Beginners take longer
-        elif skill_level == 'advanced':
-            base_time -= 10  # Advanced cooks are faster
+        # Beginners take longer, advanced cooks are faster
+        base_time = _BASE_PREP_MINUTES[skill]
         
         # Adjust based on recipe complexity
-        ingredients_count = len(recipe.get('ingredients', []))
-        steps_count = len(recipe.get('steps', []))
-        
-        complexity_factor = (ingredients_count + steps_count) / 10
-        estimated_time = int(base_time * (1 + complexity_factor))
+        estimated_time = int(base_time * (1 + complexity))
         
         return f"{estimated_time} minutes"
     
     def get_skill_recommendations(self, user_id: int) -> List[str]:
         """Get recommendations for improving cooking skills"""
-        skill_level = self.get_skill_level(user_id)
-        recommendations = []
-        
-        if skill_level == 'beginner':
-            recommendations = [
-                "Start with simple one-pot meals",
-                "Learn basic knife skills",
-                "Practice with eggs (scrambled, fried, boiled)",
-                "Master rice and pasta cooking",
-                "Learn to season food properly"
-            ]
-        elif skill_level == 'intermediate':
-            recommendations = [
-                "Try more complex techniques like braising",
-                "Experiment with different cuisines",
-                "Learn to make your own stocks and sauces",
-                "Practice timing multiple dishes",
-                "Develop your palate and taste testing skills"
-            ]
-        elif skill_level == 'advanced':
-            recommendations = [
-                "Master advanced techniques like sous vide",
-                "Create your own recipes",
-                "Learn about food science and chemistry",
-                "Experiment with fermentation",
-                "Teach others to cook"
-            ]
-        
-        return recommendations
+        skill = _SKILL_FROM_STR.get(self.get_skill_level(user_id))
+        if skill is None:
+            return []
+        return list(_SKILL_RECOMMENDATIONS[skill])
+
+def _render_skill_descriptions():
+    """Render the static skill level descriptions"""
+    st.subheader("Skill Level Descriptions")
+    
+    with st.expander("Beginner"):
+        st.markdown("""
+        **Beginner cooks** are just starting their culinary journey. They:
+        - Are learning basic cooking techniques
+        - Need detailed, step-by-step instructions
+        - Benefit from simplified recipes and clear explanations
+        - Are building confidence in the kitchen
+        """)
+    
+    with st.expander("Intermediate"):
+        st.markdown("""
+        **Intermediate cooks** have some experience and confidence. They:
+        - Can follow most recipes without detailed explanations
+        - Understand basic cooking principles
+        - Can make simple substitutions and modifications
+        - Are ready to try more complex techniques
+        """)
+    
+    with st.expander("Advanced"):
+        st.markdown("""
+        **Advanced cooks** are experienced and confident. They:
+        - Can create their own recipes
+        - Understand advanced cooking techniques
+        - Can make complex substitutions and modifications
+        - Are ready to experiment and innovate
+        """)
 
 def render_cooking_skills_ui(user_id: int, db_manager: DatabaseManager, lang: str = "en"):
     """Render cooking skills UI"""
@@ -292,38 +356,10 @@ def render_cooking_skills_ui(user_id: int, db_manager: DatabaseManager, lang: st
     
     recommendations = skill_adapter.get_skill_recommendations(user_id)
     
-    for i, rec in enumerate(recommendations, 1):
-        st.write(f"{i}. {rec}")
+    st.markdown("\n".join(f"{i}. {rec}" for i, rec in enumerate(recommendations, 1)))
     
     # Skill level descriptions
-    st.subheader("Skill Level Descriptions")
-    
-    with st.expander("Beginner"):
-        st.markdown("""
-        **Beginner cooks** are just starting their culinary journey. They:
-        - Are learning basic cooking techniques
-        - Need detailed, step-by-step instructions
-        - Benefit from simplified recipes and clear explanations
-        - Are building confidence in the kitchen
-        """)
-    
-    with st.expander("Intermediate"):
-        st.markdown("""
-        **Intermediate cooks** have some experience and confidence. They:
-        - Can follow most recipes without detailed explanations
-        - Understand basic cooking principles
-        - Can make simple substitutions and modifications
-        - Are ready to try more complex techniques
-        """)
-    
-    with st.expander("Advanced"):
-        st.markdown("""
-        **Advanced cooks** are experienced and confident. They:
-        - Can create their own recipes
-        - Understand advanced cooking techniques
-        - Can make complex substitutions and modifications
-        - Are ready to experiment and innovate
-        """)
+    _render_skill_descriptions()
     
     # Skill progress tracking
     st.subheader("Track Your Progress")
@@ -1,9 +1,18 @@
 import sqlite3
+import copy
 import json
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+import logging
+import queue
+import threading
+import sys
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Final, List, Optional, Tuple
 from dataclasses import dataclass
 import hashlib
+import hmac
 import secrets
 
 @dataclass
@@ -55,481 +64,885 @@ class CommunityChallenge:
     rewards: Dict
     is_active: bool = True
 
+logger = logging.getLogger(__name__)
+
+# Bump whenever init_database creates or migrates something new
+SCHEMA_VERSION = 6
+
+# Compiled statements kept per connection (sqlite3 defaults to 128); hot queries
+# below are module constants so every call reuses the same cached statement
+CACHED_STATEMENTS = 512
+
+# Connection pool sizing
+POOL_MIN_SIZE = 2
+POOL_MAX_SIZE = 10
+POOL_TIMEOUT = 30  # seconds to wait for a free connection
+
+# Applied to every new connection
+CONNECTION_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-20000',  # ~20MB page cache
+    'PRAGMA temp_store=MEMORY',
+]
+if sys.platform in ('linux', 'darwin'):
+    CONNECTION_PRAGMAS.append('PRAGMA mmap_size=268435456')
+
+# meal_plans and nutrition_reports store week_start/created_at as unix seconds
+_CREATE_MEAL_PLANS = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        plan_data TEXT NOT NULL,
+        week_start INTEGER NOT NULL,
+        created_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+'''
+
+_UPSERT_MEAL_PLAN: Final[str] = '''
+    INSERT INTO meal_plans (user_id, plan_data, week_start)
+    VALUES (?, ?, ?)
+    ON CONFLICT (user_id, week_start)
+    DO UPDATE SET plan_data = excluded.plan_data, created_at = excluded.created_at
+'''
+
+_CREATE_NUTRITION_REPORTS = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        week_start INTEGER NOT NULL,
+        total_calories INTEGER,
+        avg_daily_calories INTEGER,
+        protein_avg REAL,
+        carbs_avg REAL,
+        fat_avg REAL,
+        weight_change REAL,
+        goals_met TEXT,
+        recommendations TEXT,
+        created_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+'''
+
+# created_at is unix seconds, so the history index orders plain integers
+_CREATE_FOOD_RECOGNITION_LOGS = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        image_path TEXT,
+        recognized_foods TEXT,
+        confidence_scores TEXT,
+        meal_type TEXT,
+        created_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+'''
+
+_CREATE_USER_CHALLENGES = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        user_id INTEGER NOT NULL,
+        challenge_id TEXT NOT NULL,
+        progress_data TEXT,
+        completed BOOLEAN DEFAULT 0,
+        joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, challenge_id),
+        FOREIGN KEY (user_id) REFERENCES users (id),
+        FOREIGN KEY (challenge_id) REFERENCES community_challenges (id)
+    ) WITHOUT ROWID
+'''
+
+INDEX_STATEMENTS = [
+    'CREATE UNIQUE INDEX IF NOT EXISTS idx_meal_plans_user_week_unique ON meal_plans (user_id, week_start DESC)',
+    'CREATE INDEX IF NOT EXISTS idx_nutrition_reports_user_week ON nutrition_reports (user_id, week_start DESC)',
+    'CREATE INDEX IF NOT EXISTS idx_analytics_events_user_created ON analytics_events (user_id, created_at)',
+    # Covers the recognition history query, so it never touches the table
+    'CREATE INDEX IF NOT EXISTS idx_food_recognition_logs_history ON food_recognition_logs '
+    '(user_id, created_at DESC, recognized_foods, confidence_scores)',
+    'CREATE INDEX IF NOT EXISTS idx_food_recognition_cache_created ON food_recognition_cache (created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_user_preferences_user_item ON user_preferences (user_id, food_item)',
+    'CREATE INDEX IF NOT EXISTS idx_user_challenges_challenge ON user_challenges (challenge_id)',
+    'CREATE INDEX IF NOT EXISTS idx_community_challenges_active ON community_challenges (is_active, end_date)',
+]
+
+# Indexes replaced by one in INDEX_STATEMENTS, dropped on upgrade
+SUPERSEDED_INDEXES = [
+    'idx_food_recognition_logs_user_created',
+]
+
+# scrypt parameters for stored password hashes (~50ms per hash)
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_SALT_BYTES = 16
+
+# Recently read users are served from memory for a short while
+USER_CACHE_SIZE = 1024
+USER_CACHE_TTL = 30  # seconds
+
+# Encoder without the default ", "/": " padding, for JSON columns written on hot paths
+_compact_json_dumps = json.JSONEncoder(separators=(',', ':')).encode
+
+_USER_COLS = (
+    'id, email, username, auth_provider, created_at, last_login, profile_data, '
+    'preferences, cooking_skill, achievements, friends, is_active'
+)
+_SELECT_USER_BY_ID: Final[str] = f'SELECT {_USER_COLS} FROM users WHERE id = ?'
+_SELECT_USER_BY_EMAIL: Final[str] = f'SELECT {_USER_COLS} FROM users WHERE email = ?'
+_INSERT_USER: Final[str] = f'''
+    INSERT INTO users (email, username, password_hash, auth_provider, auth_id, profile_data, preferences)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    RETURNING {_USER_COLS}
+'''
+
+_REPORT_COLS = (
+    'user_id, week_start, total_calories, avg_daily_calories, protein_avg, '
+    'carbs_avg, fat_avg, weight_change, goals_met, recommendations, created_at'
+)
+_INSERT_NUTRITION_REPORT: Final[str] = f'''
+    INSERT INTO nutrition_reports
+    (user_id, week_start, total_calories, avg_daily_calories,
+     protein_avg, carbs_avg, fat_avg, weight_change, goals_met, recommendations)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    RETURNING {_REPORT_COLS}
+'''
+_SELECT_NUTRITION_REPORTS: Final[str] = f'''
+    SELECT {_REPORT_COLS}
+    FROM nutrition_reports
+    WHERE user_id = ?
+    ORDER BY week_start DESC
+    LIMIT ?
+'''
+
+# Analytics events are written in batches by a background thread
+ANALYTICS_FLUSH_INTERVAL = 0.1  # seconds
+ANALYTICS_BATCH_SIZE = 500
+
+_INSERT_ANALYTICS_EVENT: Final[str] = '''
+    INSERT INTO analytics_events (user_id, event_type, event_data)
+    VALUES (?, ?, ?)
+'''
+
+# Per-user daily event counts, kept in step with analytics_events by the writer thread
+_CREATE_ANALYTICS_DAILY = '''
+    CREATE TABLE IF NOT EXISTS analytics_daily (
+        user_id INTEGER NOT NULL,
+        day INTEGER NOT NULL,
+        event_type TEXT NOT NULL,
+        cnt INTEGER NOT NULL,
+        PRIMARY KEY (user_id, day, event_type)
+    ) WITHOUT ROWID
+'''
+
+_UPSERT_ANALYTICS_DAILY: Final[str] = '''
+    INSERT INTO analytics_daily (user_id, day, event_type, cnt)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (user_id, day, event_type) DO UPDATE SET cnt = cnt + excluded.cnt
+'''
+
+_COUNT_ANALYTICS_EVENTS: Final[str] = '''
+    SELECT COALESCE(SUM(cnt), 0) FROM analytics_daily WHERE user_id = ? AND event_type = ?
+'''
+
+_SELECT_ANALYTICS_COUNTS: Final[str] = '''
+    SELECT event_type, SUM(cnt) as count
+    FROM analytics_daily
+    WHERE user_id = ? AND day >= ?
+    GROUP BY event_type
+'''
+
+# Vision results keyed by a hash of the uploaded image; only the newest
+# RECOGNITION_CACHE_SIZE entries are kept
+RECOGNITION_CACHE_SIZE = 1024
+_CREATE_FOOD_RECOGNITION_CACHE = '''
+    CREATE TABLE IF NOT EXISTS food_recognition_cache (
+        hash TEXT PRIMARY KEY,
+        result_json TEXT NOT NULL,
+        created_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+    ) WITHOUT ROWID
+'''
+
+_SELECT_RECOGNITION_CACHE: Final[str] = 'SELECT result_json FROM food_recognition_cache WHERE hash = ?'
+_UPSERT_RECOGNITION_CACHE: Final[str] = '''
+    INSERT INTO food_recognition_cache (hash, result_json) VALUES (?, ?)
+    ON CONFLICT (hash) DO UPDATE SET result_json = excluded.result_json, created_at = excluded.created_at
+'''
+_EVICT_RECOGNITION_CACHE: Final[str] = '''
+    DELETE FROM food_recognition_cache WHERE hash IN (
+        SELECT hash FROM food_recognition_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?
+    )
+'''
+
+_INSERT_FOOD_RECOGNITION_LOG: Final[str] = '''
+    INSERT INTO food_recognition_logs (user_id, recognized_foods, confidence_scores, created_at)
+    VALUES (?, ?, ?, ?)
+'''
+_SELECT_FOOD_RECOGNITION_LOGS: Final[str] = '''
+    SELECT recognized_foods, confidence_scores, created_at
+    FROM food_recognition_logs
+    WHERE user_id = ?
+    ORDER BY created_at DESC
+    LIMIT ?
+'''
+
+_UPDATE_COOKING_SKILL: Final[str] = 'UPDATE users SET cooking_skill = ? WHERE id = ?'
+
+_INSERT_USER_PREFERENCE: Final[str] = '''
+    INSERT INTO user_preferences (user_id, food_item, rating, meal_type)
+    VALUES (?, ?, ?, ?)
+'''
+
+_SELECT_USER_PREFERENCES: Final[str] = '''
+    SELECT food_item, AVG(rating) as avg_rating, COUNT(*) as count
+    FROM user_preferences
+    WHERE user_id = ?
+    GROUP BY food_item
+    ORDER BY avg_rating DESC
+    LIMIT ?
+'''
+
+_SELECT_MEAL_PLANS: Final[str] = '''
+    SELECT plan_data, week_start, created_at
+    FROM meal_plans
+    WHERE user_id = ?
+    ORDER BY week_start DESC
+    LIMIT ?
+'''
+
+# Every table holding per-user rows, cleared when an account is deleted
+# (tables missing from an older database, such as meal_plans_superseded, are skipped)
+USER_DATA_TABLES = (
+    'user_preferences', 'meal_plans', 'meal_plans_superseded', 'nutrition_reports', 'progress_tracking',
+    'user_challenges', 'food_recognition_logs', 'analytics_events', 'analytics_daily',
+)
+
+def hash_password(password: str) -> str:
+    """Hash a password with a random salt as 'scrypt$<salt>$<hash>'"""
+    salt = secrets.token_bytes(SCRYPT_SALT_BYTES)
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P)
+    return f"scrypt${salt.hex()}${digest.hex()}"
+
+def verify_password(password: str, stored_hash: Optional[str]) -> bool:
+    """Check a password against a stored hash in constant time"""
+    if not stored_hash:
+        return False
+    
+    if stored_hash.startswith('scrypt$'):
+        _, salt_hex, digest_hex = stored_hash.split('$')
+        digest = hashlib.scrypt(password.encode(), salt=bytes.fromhex(salt_hex),
+                                n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P)
+        return hmac.compare_digest(digest.hex(), digest_hex)
+    
+    # Legacy unsalted SHA-256 hashes from older accounts
+    return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored_hash)
+
+def _to_epoch(value, utc: bool = False) -> Optional[int]:
+    """Convert a legacy TIMESTAMP text value to unix seconds"""
+    if value is None or isinstance(value, int):
+        return value
+    
+    dt = datetime.fromisoformat(value)
+    if utc:
+        # CURRENT_TIMESTAMP defaults were written in UTC
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+def _week_start_epoch(dt: datetime) -> int:
+    """Unix seconds for midnight on the Monday of dt's week"""
+    monday = (dt - timedelta(days=dt.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    return int(monday.timestamp())
+
+def _row_to_user(row: sqlite3.Row) -> User:
+    """Build a User from a row selected with _USER_COLS"""
+    return User(
+        id=row['id'],
+        email=row['email'],
+        username=row['username'],
+        auth_provider=row['auth_provider'],
+        created_at=datetime.fromisoformat(row['created_at']),
+        last_login=datetime.fromisoformat(row['last_login']),
+        profile_data=json.loads(row['profile_data'] or '{}'),
+        preferences=json.loads(row['preferences'] or '{}'),
+        cooking_skill=row['cooking_skill'] or 'beginner',
+        achievements=json.loads(row['achievements'] or '[]'),
+        friends=json.loads(row['friends'] or '[]'),
+        is_active=bool(row['is_active'])
+    )
+
+def _row_to_report(row: sqlite3.Row) -> NutritionReport:
+    """Build a NutritionReport from a row selected with _REPORT_COLS"""
+    return NutritionReport(
+        user_id=row['user_id'],
+        week_start=datetime.fromtimestamp(row['week_start']),
+        total_calories=row['total_calories'],
+        avg_daily_calories=row['avg_daily_calories'],
+        protein_avg=row['protein_avg'],
+        carbs_avg=row['carbs_avg'],
+        fat_avg=row['fat_avg'],
+        weight_change=row['weight_change'],
+        goals_met=json.loads(row['goals_met'] or '{}'),
+        recommendations=json.loads(row['recommendations'] or '[]'),
+        created_at=datetime.fromtimestamp(row['created_at'])
+    )
+
 class DatabaseManager:
     def __init__(self, db_path: str = "meal_planner.db"):
         self.db_path = db_path
+        self._pool = queue.LifoQueue(maxsize=POOL_MAX_SIZE)
+        self._pool_lock = threading.Lock()
+        self._pool_size = 0
+        self._user_cache = OrderedDict()
+        self._user_cache_lock = threading.Lock()
+        for _ in range(POOL_MIN_SIZE):
+            self._pool_size += 1
+            self._pool.put(self._connect())
         self.init_database()
+        
+        self._event_queue = queue.Queue()
+        self._event_writer = threading.Thread(target=self._analytics_flusher, daemon=True)
+        self._event_writer.start()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection to the database"""
+        conn = sqlite3.connect(
+            self.db_path,
+            cached_statements=CACHED_STATEMENTS,
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    def _acquire(self) -> sqlite3.Connection:
+        """Take a connection from the pool, opening a new one while under the size limit"""
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._pool_lock:
+            if self._pool_size < POOL_MAX_SIZE:
+                self._pool_size += 1
+                return self._connect()
+        
+        try:
+            return self._pool.get(timeout=POOL_TIMEOUT)
+        except queue.Empty:
+            raise sqlite3.OperationalError("connection pool exhausted") from None
+    
+    @contextmanager
+    def get_connection(self):
+        """Borrow a pooled connection; commits on success and rolls back on error"""
+        conn = self._acquire()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.put(conn)
+    
+    def check_writable(self):
+        """Raise if the database cannot be written; the probe write is always rolled back"""
+        conn = self._acquire()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('CREATE TABLE write_probe (x)')
+        finally:
+            conn.rollback()
+            self._pool.put(conn)
+    
+    def close(self):
+        """Close all pooled connections"""
+        self.flush_analytics()
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._pool_lock:
+                self._pool_size -= 1
     
     def init_database(self):
         """Initialize database with all required tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE NOT NULL,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT,
-                auth_provider TEXT NOT NULL,
-                auth_id TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_login TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                profile_data TEXT,
-                preferences TEXT,
-                cooking_skill TEXT DEFAULT 'beginner',
-                achievements TEXT DEFAULT '[]',
-                friends TEXT DEFAULT '[]',
-                is_active BOOLEAN DEFAULT 1
-            )
-        ''')
-        
-        # Nutrition reports table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS nutrition_reports (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                week_start TIMESTAMP NOT NULL,
-                total_calories INTEGER,
-                avg_daily_calories INTEGER,
-                protein_avg REAL,
-                carbs_avg REAL,
-                fat_avg REAL,
-                weight_change REAL,
-                goals_met TEXT,
-                recommendations TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        # User preferences learning table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_preferences (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                food_item TEXT NOT NULL,
-                rating INTEGER NOT NULL,
-                meal_type TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        # Meal plans table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS meal_plans (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                plan_data TEXT NOT NULL,
-                week_start TIMESTAMP NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        # Progress tracking table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS progress_tracking (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                date TIMESTAMP NOT NULL,
-                weight REAL,
-                body_fat REAL,
-                measurements TEXT,
-                photos TEXT,
-                notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        # Community challenges table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS community_challenges (
-                id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                description TEXT NOT NULL,
-                start_date TIMESTAMP NOT NULL,
-                end_date TIMESTAMP NOT NULL,
-                participants TEXT DEFAULT '[]',
-                rewards TEXT,
-                is_active BOOLEAN DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # User challenges participation
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_challenges (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                challenge_id TEXT NOT NULL,
-                progress_data TEXT,
-                completed BOOLEAN DEFAULT 0,
-                joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id),
-                FOREIGN KEY (challenge_id) REFERENCES community_challenges (id)
-            )
-        ''')
-        
-        # Food recognition logs
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS food_recognition_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                image_path TEXT,
-                recognized_foods TEXT,
-                confidence_scores TEXT,
-                meal_type TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
+        with self.get_connection() as conn:
+            if conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION:
+                return
+            
+            cursor = conn.cursor()
+            
+            # Users table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    email TEXT UNIQUE NOT NULL,
+                    username TEXT UNIQUE NOT NULL,
+                    password_hash TEXT,
+                    auth_provider TEXT NOT NULL,
+                    auth_id TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_login TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    profile_data TEXT,
+                    preferences TEXT,
+                    cooking_skill TEXT DEFAULT 'beginner',
+                    achievements TEXT DEFAULT '[]',
+                    friends TEXT DEFAULT '[]',
+                    is_active BOOLEAN DEFAULT 1
+                )
+            ''')
+            
+            # Nutrition reports table
+            self._migrate_to_epochs(cursor, 'nutrition_reports', _CREATE_NUTRITION_REPORTS)
+            cursor.execute(_CREATE_NUTRITION_REPORTS.format(table='nutrition_reports'))
+            
+            # User preferences learning table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_preferences (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    food_item TEXT NOT NULL,
+                    rating INTEGER NOT NULL,
+                    meal_type TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            ''')
+            
+            # Meal plans table
+            self._migrate_to_epochs(cursor, 'meal_plans', _CREATE_MEAL_PLANS)
+            cursor.execute(_CREATE_MEAL_PLANS.format(table='meal_plans'))
+            
+            # Progress tracking table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS progress_tracking (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    date TIMESTAMP NOT NULL,
+                    weight REAL,
+                    body_fat REAL,
+                    measurements TEXT,
+                    photos TEXT,
+                    notes TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            ''')
+            
+            # Community challenges table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS community_challenges (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    start_date TIMESTAMP NOT NULL,
+                    end_date TIMESTAMP NOT NULL,
+                    participants TEXT DEFAULT '[]',
+                    rewards TEXT,
+                    is_active BOOLEAN DEFAULT 1,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # User challenges participation, keyed by (user_id, challenge_id)
+            self._migrate_user_challenges(cursor)
+            cursor.execute(_CREATE_USER_CHALLENGES.format(table='user_challenges'))
+            
+            # Food recognition logs (created_at was written as local time)
+            self._migrate_to_epochs(
+                cursor, 'food_recognition_logs', _CREATE_FOOD_RECOGNITION_LOGS, created_utc=False
             )
-        ''')
+            cursor.execute(_CREATE_FOOD_RECOGNITION_LOGS.format(table='food_recognition_logs'))
+            
+            cursor.execute(_CREATE_FOOD_RECOGNITION_CACHE)
+            
+            # Analytics events
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS analytics_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    event_type TEXT NOT NULL,
+                    event_data TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            ''')
+            
+            # Daily analytics rollup, backfilled from existing events when first created
+            has_rollup = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'analytics_daily'"
+            ).fetchone()
+            cursor.execute(_CREATE_ANALYTICS_DAILY)
+            if not has_rollup:
+                cursor.execute('''
+                    INSERT INTO analytics_daily (user_id, day, event_type, cnt)
+                    SELECT user_id, CAST(strftime('%s', created_at) AS INTEGER) / 86400, event_type, COUNT(*)
+                    FROM analytics_events
+                    WHERE user_id IS NOT NULL
+                    GROUP BY 1, 2, 3
+                ''')
+            
+            # Achievements table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS achievements (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    icon TEXT,
+                    category TEXT,
+                    points INTEGER DEFAULT 0,
+                    requirements TEXT,
+                    is_active BOOLEAN DEFAULT 1
+                )
+            ''')
+            
+            # Indexes for the per-user lookups and date ordering used by hot queries
+            self._dedupe_meal_plans(cursor)
+            for name in SUPERSEDED_INDEXES:
+                cursor.execute(f'DROP INDEX IF EXISTS {name}')
+            for statement in INDEX_STATEMENTS:
+                cursor.execute(statement)
+        self._init_default_data()
         
-        # Analytics events
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS analytics_events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                event_type TEXT NOT NULL,
-                event_data TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
+        with self.get_connection() as conn:
+            conn.execute('ANALYZE')
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    
+    def _migrate_to_epochs(self, cursor: sqlite3.Cursor, table: str, create_sql: str,
+                           created_utc: bool = True):
+        """Rebuild a table whose week_start/created_at columns are still TIMESTAMP text"""
+        types = {row[1]: row[2] for row in cursor.execute(f'PRAGMA table_info({table})')}
+        if types.get('created_at') != 'TIMESTAMP':
+            return
+        
+        rows = [dict(row) for row in cursor.execute(f'SELECT * FROM {table}')]
+        for row in rows:
+            if 'week_start' in row:
+                row['week_start'] = _to_epoch(row['week_start'])
+            row['created_at'] = _to_epoch(row['created_at'], utc=created_utc)
+        
+        cursor.execute(create_sql.format(table=f'{table}_new'))
+        if rows:
+            columns = list(rows[0])
+            cursor.executemany(
+                f"INSERT INTO {table}_new ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [tuple(row[c] for c in columns) for row in rows]
             )
-        ''')
+        cursor.execute(f'DROP TABLE {table}')
+        cursor.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+    
+    def _dedupe_meal_plans(self, cursor: sqlite3.Cursor):
+        """Snap meal plans to their week start and keep only the latest plan per week;
+        older plans for the same week are moved to meal_plans_superseded rather than dropped"""
+        if cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_meal_plans_user_week_unique'"
+        ).fetchone():
+            return
+        
+        cursor.execute('DROP INDEX IF EXISTS idx_meal_plans_user_week')
+        rows = cursor.execute('SELECT id, week_start FROM meal_plans').fetchall()
+        cursor.executemany('UPDATE meal_plans SET week_start = ? WHERE id = ?', [
+            (_week_start_epoch(datetime.fromtimestamp(row['week_start'])), row['id']) for row in rows
+        ])
+        cursor.execute('CREATE TABLE IF NOT EXISTS meal_plans_superseded AS SELECT * FROM meal_plans WHERE 0')
+        superseded = 'FROM meal_plans WHERE id NOT IN (SELECT MAX(id) FROM meal_plans GROUP BY user_id, week_start)'
+        cursor.execute(f'INSERT INTO meal_plans_superseded SELECT * {superseded}')
+        cursor.execute(f'DELETE {superseded}')
+    
+    def _migrate_user_challenges(self, cursor: sqlite3.Cursor):
+        """Rebuild a user_challenges table from the old surrogate-id layout"""
+        columns = [row[1] for row in cursor.execute('PRAGMA table_info(user_challenges)')]
+        if 'id' not in columns:
+            return
         
-        # Achievements table
+        cursor.execute(_CREATE_USER_CHALLENGES.format(table='user_challenges_new'))
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS achievements (
-                id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                description TEXT NOT NULL,
-                icon TEXT,
-                category TEXT,
-                points INTEGER DEFAULT 0,
-                requirements TEXT,
-                is_active BOOLEAN DEFAULT 1
-            )
+            INSERT OR IGNORE INTO user_challenges_new
+                (user_id, challenge_id, progress_data, completed, joined_at)
+            SELECT user_id, challenge_id, progress_data, completed, joined_at
+            FROM user_challenges ORDER BY id
         ''')
-        
-        conn.commit()
-        conn.close()
-        self._init_default_data()
+        cursor.execute('DROP TABLE user_challenges')
+        cursor.execute('ALTER TABLE user_challenges_new RENAME TO user_challenges')
     
     def _init_default_data(self):
         """Initialize default achievements and challenges"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Default achievements
-        achievements = [
-            {
-                'id': 'first_week',
-                'name': 'First Week Complete',
-                'description': 'Completed your first week of meal planning',
-                'icon': '🎉',
-                'category': 'consistency',
-                'requirements': {'weeks_completed': 1}
-            },
-            {
-                'id': 'protein_master',
-                'name': 'Protein Master',
-                'description': 'Met protein goals for 7 consecutive days',
-                'icon': '💪',
-                'category': 'nutrition',
-                'requirements': {'protein_days': 7}
-            },
-            {
-                'id': 'meal_prep_pro',
-                'name': 'Meal Prep Pro',
-                'description': 'Generated 10 meal plans',
-                'icon': '🍽️',
-                'category': 'cooking',
-                'requirements': {'meal_plans': 10}
-            },
-            {
-                'id': 'social_butterfly',
-                'name': 'Social Butterfly',
-                'description': 'Shared progress with 5 friends',
-                'icon': '🦋',
-                'category': 'social',
-                'requirements': {'shared_progress': 5}
-            }
-        ]
-        
-        # Insert default achievements (if not exists)
-        for achievement in achievements:
-            cursor.execute('''
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            
+            # Default achievements
+            achievements = [
+                {
+                    'id': 'first_week',
+                    'name': 'First Week Complete',
+                    'description': 'Completed your first week of meal planning',
+                    'icon': '🎉',
+                    'category': 'consistency',
+                    'requirements': {'weeks_completed': 1}
+                },
+                {
+                    'id': 'protein_master',
+                    'name': 'Protein Master',
+                    'description': 'Met protein goals for 7 consecutive days',
+                    'icon': '💪',
+                    'category': 'nutrition',
+                    'requirements': {'protein_days': 7}
+                },
+                {
+                    'id': 'meal_prep_pro',
+                    'name': 'Meal Prep Pro',
+                    'description': 'Generated 10 meal plans',
+                    'icon': '🍽️',
+                    'category': 'cooking',
+                    'requirements': {'meal_plans': 10}
+                },
+                {
+                    'id': 'social_butterfly',
+                    'name': 'Social Butterfly',
+                    'description': 'Shared progress with 5 friends',
+                    'icon': '🦋',
+                    'category': 'social',
+                    'requirements': {'shared_progress': 5}
+                }
+            ]
+            
+            # Insert default achievements (if not exists)
+            cursor.executemany('''
                 INSERT OR IGNORE INTO achievements (id, name, description, icon, category, requirements)
                 VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                achievement['id'],
-                achievement['name'],
-                achievement['description'],
-                achievement['icon'],
-                achievement['category'],
-                json.dumps(achievement['requirements'])
-            ))
-        
-        conn.commit()
-        conn.close()
+            ''', [
+                (a['id'], a['name'], a['description'], a['icon'], a['category'], json.dumps(a['requirements']))
+                for a in achievements
+            ])
     
     def create_user(self, email: str, username: str, auth_provider: str, 
                    auth_id: str = None, password: str = None, profile_data: Dict = None) -> User:
         """Create a new user"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         password_hash = None
         if password:
-            password_hash = hashlib.sha256(password.encode()).hexdigest()
-        
-        cursor.execute('''
-            INSERT INTO users (email, username, password_hash, auth_provider, auth_id, profile_data, preferences)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            email, username, password_hash, auth_provider, auth_id,
-            json.dumps(profile_data or {}),
-            json.dumps({'dietary_restrictions': [], 'favorite_cuisines': [], 'disliked_foods': []})
-        ))
+            password_hash = hash_password(password)
         
-        user_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        with self.get_connection() as conn:
+            row = conn.execute(_INSERT_USER, (
+                email, username, password_hash, auth_provider, auth_id,
+                json.dumps(profile_data or {}),
+                json.dumps({'dietary_restrictions': [], 'favorite_cuisines': [], 'disliked_foods': []})
+            )).fetchone()
         
-        return self.get_user_by_id(user_id)
+        return _row_to_user(row)
     
     def get_user_by_id(self, user_id: int) -> Optional[User]:
         """Get user by ID"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        now = time.monotonic()
+        with self._user_cache_lock:
+            cached = self._user_cache.get(user_id)
+            if cached and cached[0] > now:
+                self._user_cache.move_to_end(user_id)
+                return copy.deepcopy(cached[1])
         
-        cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
-        row = cursor.fetchone()
-        conn.close()
+        with self.get_connection() as conn:
+            row = conn.execute(_SELECT_USER_BY_ID, (user_id,)).fetchone()
         
         if not row:
             return None
         
-        return User(
-            id=row[0],
-            email=row[1],
-            username=row[2],
-            auth_provider=row[4],
-            created_at=datetime.fromisoformat(row[6]),
-            last_login=datetime.fromisoformat(row[7]),
-            profile_data=json.loads(row[8] or '{}'),
-            preferences=json.loads(row[9] or '{}'),
-            cooking_skill=row[10] or 'beginner',
-            achievements=json.loads(row[11] or '[]'),
-            friends=json.loads(row[12] or '[]'),
-            is_active=bool(row[13])
-        )
+        user = _row_to_user(row)
+        with self._user_cache_lock:
+            # Callers get their own copy, so edits to a returned user never leak into the cache
+            self._user_cache[user_id] = (now + USER_CACHE_TTL, copy.deepcopy(user))
+            self._user_cache.move_to_end(user_id)
+            if len(self._user_cache) > USER_CACHE_SIZE:
+                self._user_cache.popitem(last=False)
+        return user
+    
+    def invalidate_user_cache(self, user_id: int):
+        """Drop a cached user after its row has been written"""
+        with self._user_cache_lock:
+            self._user_cache.pop(user_id, None)
+    
+    def delete_user(self, user_id: int):
+        """Delete a user and all of their data in one transaction"""
+        self.flush_analytics()
+        with self.get_connection() as conn:
+            existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for table in USER_DATA_TABLES:
+                if table in existing:
+                    conn.execute(f'DELETE FROM {table} WHERE user_id = ?', (user_id,))
+            conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
+        self.invalidate_user_cache(user_id)
     
     def get_user_by_email(self, email: str) -> Optional[User]:
         """Get user by email"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM users WHERE email = ?', (email,))
-        row = cursor.fetchone()
-        conn.close()
+        with self.get_connection() as conn:
+            row = conn.execute(_SELECT_USER_BY_EMAIL, (email,)).fetchone()
         
-        if not row:
-            return None
-        
-        return User(
-            id=row[0],
-            email=row[1],
-            username=row[2],
-            auth_provider=row[4],
-            created_at=datetime.fromisoformat(row[6]),
-            last_login=datetime.fromisoformat(row[7]),
-            profile_data=json.loads(row[8] or '{}'),
-            preferences=json.loads(row[9] or '{}'),
-            cooking_skill=row[10] or 'beginner',
-            achievements=json.loads(row[11] or '[]'),
-            friends=json.loads(row[12] or '[]'),
-            is_active=bool(row[13])
-        )
+        return _row_to_user(row) if row else None
+    
+    def update_cooking_skill(self, user_id: int, skill_level: str):
+        """Update user's cooking skill level"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(_UPDATE_COOKING_SKILL, (skill_level, user_id))
+        self.invalidate_user_cache(user_id)
     
     def update_user_preferences(self, user_id: int, food_item: str, rating: int, meal_type: str = None):
         """Update user food preferences based on ratings"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO user_preferences (user_id, food_item, rating, meal_type)
-            VALUES (?, ?, ?, ?)
-        ''', (user_id, food_item, rating, meal_type))
-        
-        conn.commit()
-        conn.close()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(_INSERT_USER_PREFERENCE, (user_id, food_item, rating, meal_type))
     
-    def get_user_preferences(self, user_id: int) -> Dict:
-        """Get user's learned food preferences"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT food_item, AVG(rating) as avg_rating, COUNT(*) as count
-            FROM user_preferences 
-            WHERE user_id = ?
-            GROUP BY food_item
-            ORDER BY avg_rating DESC
-        ''', (user_id,))
-        
-        preferences = {}
-        for row in cursor.fetchall():
-            preferences[row[0]] = {
-                'avg_rating': row[1],
-                'count': row[2]
-            }
-        
-        conn.close()
-        return preferences
+    def get_user_preferences(self, user_id: int, limit: Optional[int] = None) -> Dict:
+        """Get user's learned food preferences, optionally only the top `limit` by rating"""
+        with self.get_connection() as conn:
+            cursor = conn.execute(_SELECT_USER_PREFERENCES, (user_id, -1 if limit is None else limit))
+            
+            return {row[0]: {'avg_rating': row[1], 'count': row[2]} for row in cursor}
     
     def save_meal_plan(self, user_id: int, plan_data: Dict, week_start: datetime):
-        """Save user's meal plan"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO meal_plans (user_id, plan_data, week_start)
-            VALUES (?, ?, ?)
-        ''', (user_id, json.dumps(plan_data), week_start))
-        
-        conn.commit()
-        conn.close()
+        """Save user's meal plan, replacing any plan already saved for that week"""
+        with self.get_connection() as conn:
+            conn.execute(_UPSERT_MEAL_PLAN, (user_id, json.dumps(plan_data), _week_start_epoch(week_start)))
     
     def get_meal_plans(self, user_id: int, limit: int = 10) -> List[Dict]:
         """Get user's meal plans"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT plan_data, week_start, created_at
-            FROM meal_plans 
-            WHERE user_id = ?
-            ORDER BY week_start DESC
-            LIMIT ?
-        ''', (user_id, limit))
-        
-        plans = []
-        for row in cursor.fetchall():
-            plans.append({
-                'plan_data': json.loads(row[0]),
-                'week_start': datetime.fromisoformat(row[1]),
-                'created_at': datetime.fromisoformat(row[2])
-            })
-        
-        conn.close()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(_SELECT_MEAL_PLANS, (user_id, limit))
+            
+            plans = []
+            for row in cursor.fetchall():
+                plans.append({
+                    'plan_data': json.loads(row[0]),
+                    'week_start': datetime.fromtimestamp(row[1]),
+                    'created_at': datetime.fromtimestamp(row[2])
+                })
         return plans
     
     def create_nutrition_report(self, user_id: int, week_start: datetime, 
                               nutrition_data: Dict, recommendations: List[str]) -> NutritionReport:
         """Create a weekly nutrition report"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO nutrition_reports 
-            (user_id, week_start, total_calories, avg_daily_calories, 
-             protein_avg, carbs_avg, fat_avg, weight_change, goals_met, recommendations)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            user_id, week_start,
-            nutrition_data.get('total_calories', 0),
-            nutrition_data.get('avg_daily_calories', 0),
-            nutrition_data.get('protein_avg', 0),
-            nutrition_data.get('carbs_avg', 0),
-            nutrition_data.get('fat_avg', 0),
-            nutrition_data.get('weight_change', 0),
-            json.dumps(nutrition_data.get('goals_met', {})),
-            json.dumps(recommendations)
-        ))
-        
-        report_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
-        return NutritionReport(
-            user_id=user_id,
-            week_start=week_start,
-            total_calories=nutrition_data.get('total_calories', 0),
-            avg_daily_calories=nutrition_data.get('avg_daily_calories', 0),
-            protein_avg=nutrition_data.get('protein_avg', 0),
-            carbs_avg=nutrition_data.get('carbs_avg', 0),
-            fat_avg=nutrition_data.get('fat_avg', 0),
-            weight_change=nutrition_data.get('weight_change', 0),
-            goals_met=nutrition_data.get('goals_met', {}),
-            recommendations=recommendations,
-            created_at=datetime.now()
-        )
+        with self.get_connection() as conn:
+            row = conn.execute(_INSERT_NUTRITION_REPORT, (
+                user_id, int(week_start.timestamp()),
+                nutrition_data.get('total_calories', 0),
+                nutrition_data.get('avg_daily_calories', 0),
+                nutrition_data.get('protein_avg', 0),
+                nutrition_data.get('carbs_avg', 0),
+                nutrition_data.get('fat_avg', 0),
+                nutrition_data.get('weight_change', 0),
+                json.dumps(nutrition_data.get('goals_met', {})),
+                json.dumps(recommendations)
+            )).fetchone()
+        
+        return _row_to_report(row)
     
     def get_nutrition_reports(self, user_id: int, limit: int = 12) -> List[NutritionReport]:
         """Get user's nutrition reports"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM nutrition_reports 
-            WHERE user_id = ?
-            ORDER BY week_start DESC
-            LIMIT ?
-        ''', (user_id, limit))
-        
-        reports = []
-        for row in cursor.fetchall():
-            reports.append(NutritionReport(
-                user_id=row[1],
-                week_start=datetime.fromisoformat(row[2]),
-                total_calories=row[3],
-                avg_daily_calories=row[4],
-                protein_avg=row[5],
-                carbs_avg=row[6],
-                fat_avg=row[7],
-                weight_change=row[8],
-                goals_met=json.loads(row[9] or '{}'),
-                recommendations=json.loads(row[10] or '[]'),
-                created_at=datetime.fromisoformat(row[11])
+        with self.get_connection() as conn:
+            cursor = conn.execute(_SELECT_NUTRITION_REPORTS, (user_id, limit))
+            
+            return [_row_to_report(row) for row in cursor]
+    
+    def get_cached_recognition(self, image_hash: str) -> Optional[Dict]:
+        """Get a stored food recognition result for an image hash"""
+        with self.get_connection() as conn:
+            row = conn.execute(_SELECT_RECOGNITION_CACHE, (image_hash,)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def cache_recognition(self, image_hash: str, result: Dict):
+        """Store a food recognition result under its image hash, evicting the oldest beyond the cap"""
+        with self.get_connection() as conn:
+            conn.execute(_UPSERT_RECOGNITION_CACHE, (image_hash, _compact_json_dumps(result)))
+            conn.execute(_EVICT_RECOGNITION_CACHE, (RECOGNITION_CACHE_SIZE,))
+    
+    def log_food_recognition(self, user_id: int, recognized_foods: List[str], confidence_scores: List[int]):
+        """Record the foods recognized in one image and its analytics event in a single commit"""
+        with self.get_connection() as conn:
+            conn.execute(_INSERT_FOOD_RECOGNITION_LOG, (
+                user_id, _compact_json_dumps(recognized_foods), _compact_json_dumps(confidence_scores),
+                int(time.time())
             ))
-        
-        conn.close()
-        return reports
+            self.log_analytics_event(user_id, 'food_recognition', {
+                'recognized_foods': recognized_foods,
+                'confidence_scores': confidence_scores
+            }, conn=conn)
     
-    def log_analytics_event(self, user_id: int, event_type: str, event_data: Dict = None):
-        """Log analytics event"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO analytics_events (user_id, event_type, event_data)
-            VALUES (?, ?, ?)
-        ''', (user_id, event_type, json.dumps(event_data or {})))
-        
-        conn.commit()
-        conn.close()
+    def get_food_recognition_logs(self, user_id: int, limit: int = 20) -> List[Dict]:
+        """Get user's most recent food recognition results"""
+        with self.get_connection() as conn:
+            cursor = conn.execute(_SELECT_FOOD_RECOGNITION_LOGS, (user_id, limit))
+            
+            return [{
+                'recognized_foods': json.loads(row[0] or '[]'),
+                'confidence_scores': json.loads(row[1] or '[]'),
+                'created_at': datetime.fromtimestamp(row[2])
+            } for row in cursor]
+    
+    def log_analytics_event(self, user_id: int, event_type: str, event_data: Dict = None,
+                            conn: Optional[sqlite3.Connection] = None):
+        """Queue an analytics event for the background writer, or write it in `conn`'s transaction"""
+        event = (user_id, event_type, json.dumps(event_data or {}))
+        if conn is None:
+            self._event_queue.put(event)
+            return
+        
+        conn.execute(_INSERT_ANALYTICS_EVENT, event)
+        if user_id is not None:
+            conn.execute(_UPSERT_ANALYTICS_DAILY, (user_id, int(time.time()) // 86400, event_type, 1))
+    
+    def flush_analytics(self):
+        """Block until every queued analytics event has been written"""
+        self._event_queue.join()
+    
+    def _analytics_flusher(self):
+        """Drain queued events and insert them in one transaction per batch"""
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                batch.append(self._event_queue.get(timeout=timeout))
+                if deadline is None:
+                    deadline = time.monotonic() + ANALYTICS_FLUSH_INTERVAL
+                if len(batch) < ANALYTICS_BATCH_SIZE and time.monotonic() < deadline:
+                    continue
+            except queue.Empty:
+                pass
+            
+            try:
+                day = int(time.time()) // 86400
+                daily = Counter(
+                    (user_id, event_type) for user_id, event_type, _ in batch if user_id is not None
+                )
+                with self.get_connection() as conn:
+                    conn.executemany(_INSERT_ANALYTICS_EVENT, batch)
+                    conn.executemany(_UPSERT_ANALYTICS_DAILY, [
+                        (user_id, day, event_type, cnt) for (user_id, event_type), cnt in daily.items()
+                    ])
+            except Exception:
+                logger.exception("Failed to write %d analytics events", len(batch))
+            finally:
+                for _ in batch:
+                    self._event_queue.task_done()
+                batch = []
+                deadline = None
+    
+    def count_analytics_events(self, user_id: int, event_type: str) -> int:
+        """Number of `event_type` events a user has ever logged, from the daily rollup"""
+        self.flush_analytics()
+        with self.get_connection() as conn:
+            return conn.execute(_COUNT_ANALYTICS_EVENTS, (user_id, event_type)).fetchone()[0]
     
     def get_analytics_data(self, user_id: int, days: int = 30) -> Dict:
         """Get analytics data for user"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        start_date = datetime.now() - timedelta(days=days)
-        
-        cursor.execute('''
-            SELECT event_type, COUNT(*) as count
-            FROM analytics_events 
-            WHERE user_id = ? AND created_at >= ?
-            GROUP BY event_type
-        ''', (user_id, start_date))
-        
-        events = {}
-        for row in cursor.fetchall():
-            events[row[0]] = row[1]
-        
-        conn.close()
-        return events
+        self.flush_analytics()
+        start_day = (int(time.time()) - days * 86400) // 86400
+        with self.get_connection() as conn:
+            cursor = conn.execute(_SELECT_ANALYTICS_COUNTS, (user_id, start_day))
+            
+            return {row[0]: row[1] for row in cursor}
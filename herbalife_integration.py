@@ -2,226 +2,294 @@ import streamlit as st
 import json
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
+from dataclasses import dataclass, field
+from collections import defaultdict
+from functools import lru_cache
 from database import DatabaseManager
 import random
 
+@dataclass(slots=True, frozen=True)
 class HerbalifeProduct:
     """Herbalife product data model"""
-    def __init__(self, name: str, product_type: str, calories: int, protein: float, 
-                 carbs: float, fat: float, serving_size: str, meal_timing: List[str],
-                 preparation: str, benefits: List[str], albanian_name: str = None):
-        self.name = name
-        self.product_type = product_type  # 'shake', 'tea', 'supplement', 'snack'
-        self.calories = calories
-        self.protein = protein
-        self.carbs = carbs
-        self.fat = fat
-        self.serving_size = serving_size
-        self.meal_timing = meal_timing  # ['breakfast', 'lunch', 'dinner', 'snack']
-        self.preparation = preparation
-        self.benefits = benefits
-        self.albanian_name = albanian_name or name
+    name: str
+    product_type: str  # 'shake', 'tea', 'supplement', 'snack'
+    calories: int
+    protein: float
+    carbs: float
+    fat: float
+    serving_size: str
+    meal_timing: Tuple[str, ...]  # ('breakfast', 'lunch', 'dinner', 'snack')
+    preparation: str
+    benefits: Tuple[str, ...]
+    albanian_name: Optional[str] = None
+    macros: Tuple[int, float, float, float] = field(init=False, repr=False, compare=False)  # (calories, protein, carbs, fat)
+    
+    def __post_init__(self):
+        if not self.albanian_name:
+            object.__setattr__(self, 'albanian_name', self.name)
+        object.__setattr__(self, 'macros', (self.calories, self.protein, self.carbs, self.fat))
+
+# Meal timings and benefits shared between products
+_MT_ALL = ("breakfast", "lunch", "dinner")
+_MT_ALL_SNACK = _MT_ALL + ("snack",)
+_MT_BS = ("breakfast", "snack")
+_MT_SNACK = ("snack",)
+_F1_BENEFITS = ("Meal replacement", "High protein", "21 essential nutrients", "Weight management")
+
+def _build_products() -> Dict[str, HerbalifeProduct]:
+    """Initialize comprehensive Herbalife product database"""
+    products = {}
+    
+    # Formula 1 Nutritional Shake Mix - Core product
+    products['formula1_vanilla'] = HerbalifeProduct(
+        name="Formula 1 Nutritional Shake Mix - Vanilla",
+        albanian_name="Formula 1 Përzierje Nutritive - Vanilje",
+        product_type="shake",
+        calories=170,
+        protein=17.0,
+        carbs=13.0,
+        fat=2.0,
+        serving_size="2 scoops + 250ml milk",
+        meal_timing=_MT_ALL,
+        preparation="Mix 2 scoops with 250ml nonfat milk or soymilk. Blend or shake well.",
+        benefits=_F1_BENEFITS
+    )
+    
+    products['formula1_chocolate'] = HerbalifeProduct(
+        name="Formula 1 Nutritional Shake Mix - Chocolate",
+        albanian_name="Formula 1 Përzierje Nutritive - Çokollatë",
+        product_type="shake",
+        calories=170,
+        protein=17.0,
+        carbs=13.0,
+        fat=2.0,
+        serving_size="2 scoops + 250ml milk",
+        meal_timing=_MT_ALL,
+        preparation="Mix 2 scoops with 250ml nonfat milk or soymilk. Blend or shake well.",
+        benefits=_F1_BENEFITS
+    )
+    
+    # Personalized Protein Powder
+    products['protein_powder'] = HerbalifeProduct(
+        name="Personalized Protein Powder",
+        albanian_name="Pluhur Proteini i Personalizuar",
+        product_type="supplement",
+        calories=20,
+        protein=5.0,
+        carbs=0.0,
+        fat=0.0,
+        serving_size="1 tablespoon",
+        meal_timing=_MT_ALL_SNACK,
+        preparation="Add to shakes, smoothies, or meals to increase protein content.",
+        benefits=("Additional protein", "Muscle support", "Versatile usage")
+    )
+    
+    # Herbal Tea Concentrate
+    products['herbal_tea'] = HerbalifeProduct(
+        name="Herbal Tea Concentrate",
+        albanian_name="Koncentrat Çaji Bimor",
+        product_type="tea",
+        calories=5,
+        protein=0.0,
+        carbs=1.0,
+        fat=0.0,
+        serving_size="1 teaspoon + 250ml water",
+        meal_timing=_MT_BS,
+        preparation="Mix 1 teaspoon with 250ml hot water. Steep for 3-5 minutes.",
+        benefits=("Metabolism support", "Antioxidants", "Natural energy")
+    )
+    
+    # Afresh Energy Drink
+    products['afresh_energy'] = HerbalifeProduct(
+        name="Afresh Energy Drink",
+        albanian_name="Pije Energjie Afresh",
+        product_type="tea",
+        calories=15,
+        protein=0.0,
+        carbs=4.0,
+        fat=0.0,
+        serving_size="1 sachet + 250ml water",
+        meal_timing=_MT_BS,
+        preparation="Mix 1 sachet with 250ml cold water. Stir well.",
+        benefits=("Natural energy", "Caffeine", "Tulsi extract", "Low calorie")
+    )
+    
+    # Herbal Aloe Concentrate
+    products['aloe_concentrate'] = HerbalifeProduct(
+        name="Herbal Aloe Concentrate",
+        albanian_name="Koncentrat Aloe Bimor",
+        product_type="supplement",
+        calories=10,
+        protein=0.0,
+        carbs=2.0,
+        fat=0.0,
+        serving_size="2 capfuls + 250ml water",
+        meal_timing=_MT_ALL,
+        preparation="Mix 2 capfuls with 250ml water. Drink throughout the day.",
+        benefits=("Digestive health", "Hydration", "Nutrient absorption")
+    )
+    
+    # Protein Bars
+    products['protein_bar'] = HerbalifeProduct(
+        name="Protein Bar",
+        albanian_name="Biskotë Proteini",
+        product_type="snack",
+        calories=140,
+        protein=10.0,
+        carbs=15.0,
+        fat=4.0,
+        serving_size="1 bar",
+        meal_timing=_MT_SNACK,
+        preparation="Ready to eat. Store in cool, dry place.",
+        benefits=("Convenient protein", "Portable snack", "Satisfying")
+    )
+    
+    return products
+
+# Product catalog, built once at import and shared by every HerbalifeIntegration
+_PRODUCTS = _build_products()
+
+# Albanian and English goal labels mapped to a single key
+_GOAL_ALIAS = {
+    "Humbje peshe": "loss", "Weight Loss": "loss",
+    "Mbajtje": "maint", "Maintenance": "maint",
+    "Shtim muskuj": "muscle", "Muscle Building": "muscle",
+}
+
+_MAIN_MEALS = ("breakfast", "lunch", "dinner")
+
+# Recommended products per (goal, meal type), most important first
+_RECS: Dict[Tuple[str, str], Tuple[HerbalifeProduct, ...]] = {
+    # Weight loss: Formula 1 for breakfast and lunch, light protein at dinner
+    ("loss", "breakfast"): (_PRODUCTS['formula1_vanilla'], _PRODUCTS['herbal_tea']),
+    ("loss", "lunch"): (_PRODUCTS['formula1_chocolate'], _PRODUCTS['aloe_concentrate']),
+    ("loss", "dinner"): (_PRODUCTS['protein_powder'],),
+    ("loss", "snack"): (_PRODUCTS['protein_bar'], _PRODUCTS['afresh_energy']),
+    # Maintenance: regular meals with a Herbalife supplement
+    ("maint", "breakfast"): (_PRODUCTS['formula1_vanilla'], _PRODUCTS['herbal_tea']),
+    ("maint", "lunch"): (_PRODUCTS['protein_powder'],),
+    ("maint", "dinner"): (_PRODUCTS['aloe_concentrate'],),
+    ("maint", "snack"): (_PRODUCTS['protein_bar'],),
+    # Muscle building: extra protein throughout the day
+    ("muscle", "breakfast"): (_PRODUCTS['formula1_chocolate'], _PRODUCTS['protein_powder']),
+    ("muscle", "lunch"): (_PRODUCTS['formula1_vanilla'], _PRODUCTS['protein_powder']),
+    ("muscle", "dinner"): (_PRODUCTS['protein_powder'],),
+    ("muscle", "snack"): (_PRODUCTS['protein_bar'], _PRODUCTS['protein_powder']),
+}
+
+def _meal(primary: HerbalifeProduct, supplement: Optional[HerbalifeProduct],
+          recommendation: str, albanian_recommendation: str) -> Dict:
+    """Meal plan entry with its calorie total precomputed"""
+    return {
+        "primary": primary,
+        "supplement": supplement,
+        "total_calories": primary.calories + (supplement.calories if supplement else 0),
+        "recommendation": recommendation,
+        "albanian_recommendation": albanian_recommendation
+    }
+
+def _snacks(snacks: Tuple[HerbalifeProduct, ...]) -> Dict:
+    """Snack plan entry with its calorie total precomputed"""
+    return {
+        "snacks": snacks,
+        "total_calories": sum(s.calories for s in snacks),
+        "recommendation": "Herbalife snacks provide convenient nutrition between meals.",
+        "albanian_recommendation": "Ushqimet e lehta Herbalife ofrojnë ushqim të përshtatshëm midis vakteve."
+    }
+
+# Meal plan entries per (goal, meal); a None goal is the fallback for every other goal.
+# _meal_template hands out copies, so a caller editing its plan can't change them.
+_MEAL_TEMPLATES: Dict[Tuple[Optional[str], str], Dict] = {
+    ("loss", "breakfast"): _meal(
+        _PRODUCTS['formula1_vanilla'], _PRODUCTS['herbal_tea'],
+        "Formula 1 shake for breakfast provides controlled calories and essential nutrients. Herbal tea supports metabolism.",
+        "Formula 1 për mëngjes ofron kalori të kontrolluara dhe lëndë ushqyese thelbësore. Çaji bimor mbështet metabolizmin."
+    ),
+    (None, "breakfast"): _meal(
+        _PRODUCTS['formula1_chocolate'], _PRODUCTS['herbal_tea'],
+        "Formula 1 shake provides a nutritious start to your day with high-quality protein.",
+        "Formula 1 ofron një fillim ushqyes për ditën tuaj me proteinë cilësore të lartë."
+    ),
+    ("loss", "lunch"): _meal(
+        _PRODUCTS['formula1_chocolate'], _PRODUCTS['aloe_concentrate'],
+        "Formula 1 shake for lunch helps maintain calorie control while providing essential nutrients.",
+        "Formula 1 për drekë ndihmon në kontrollin e kalorive duke ofruar lëndë ushqyese thelbësore."
+    ),
+    (None, "lunch"): _meal(
+        _PRODUCTS['protein_powder'], _PRODUCTS['aloe_concentrate'],
+        "Add protein powder to your regular lunch for extra protein. Aloe supports digestive health.",
+        "Shtoni pluhurin e proteinës në drekën tuaj të rregullt për proteinë shtesë. Aloe mbështet shëndetin tretësor."
+    ),
+    ("muscle", "dinner"): _meal(
+        _PRODUCTS['protein_powder'], _PRODUCTS['aloe_concentrate'],
+        "Protein powder with dinner supports muscle recovery. Aloe aids digestion.",
+        "Pluhuri i proteinës me darkën mbështet rikuperimin e muskujve. Aloe ndihmon tretjen."
+    ),
+    (None, "dinner"): _meal(
+        _PRODUCTS['aloe_concentrate'], None,
+        "Aloe concentrate supports digestive health and nutrient absorption.",
+        "Koncentrati i aloe mbështet shëndetin tretësor dhe thithjen e lëndëve ushqyese."
+    ),
+    ("loss", "snacks"): _snacks((_PRODUCTS['protein_bar'], _PRODUCTS['afresh_energy'])),
+    (None, "snacks"): _snacks((_PRODUCTS['protein_bar'], _PRODUCTS['herbal_tea'])),
+}
+
+def _meal_template(goal: str, meal: str) -> Dict:
+    """Copy of the precomputed plan entry for a goal and meal"""
+    template = _MEAL_TEMPLATES.get((_GOAL_ALIAS.get(goal), meal))
+    return dict(template if template is not None else _MEAL_TEMPLATES[(None, meal)])
+
+@lru_cache(maxsize=32)
+def _parse_pattern(pattern: str) -> Optional[Tuple[int, int, int]]:
+    """Breakfast/lunch/dinner percentages from a pattern like 30/40/30, or None if it doesn't parse"""
+    parsed = None
+    parts = pattern.split("/")
+    if len(parts) == 3:
+        try:
+            values = tuple(int(x) for x in parts)
+        except ValueError:
+            values = None
+        if values and sum(values) > 0:
+            parsed = values
+    return parsed
 
 class HerbalifeIntegration:
     """Professional Herbalife integration system"""
     
     def __init__(self, db_manager: Optional[DatabaseManager]):
         self.db = db_manager
-        self.products = self._initialize_herbalife_products()
-    
-    def _initialize_herbalife_products(self) -> Dict[str, HerbalifeProduct]:
-        """Initialize comprehensive Herbalife product database"""
-        products = {}
-        
-        # Formula 1 Nutritional Shake Mix - Core product
-        products['formula1_vanilla'] = HerbalifeProduct(
-            name="Formula 1 Nutritional Shake Mix - Vanilla",
-            albanian_name="Formula 1 Përzierje Nutritive - Vanilje",
-            product_type="shake",
-            calories=170,
-            protein=17.0,
-            carbs=13.0,
-            fat=2.0,
-            serving_size="2 scoops + 250ml milk",
-            meal_timing=["breakfast", "lunch", "dinner"],
-            preparation="Mix 2 scoops with 250ml nonfat milk or soymilk. Blend or shake well.",
-            benefits=["Meal replacement", "High protein", "21 essential nutrients", "Weight management"]
-        )
-        
-        products['formula1_chocolate'] = HerbalifeProduct(
-            name="Formula 1 Nutritional Shake Mix - Chocolate",
-            albanian_name="Formula 1 Përzierje Nutritive - Çokollatë",
-            product_type="shake",
-            calories=170,
-            protein=17.0,
-            carbs=13.0,
-            fat=2.0,
-            serving_size="2 scoops + 250ml milk",
-            meal_timing=["breakfast", "lunch", "dinner"],
-            preparation="Mix 2 scoops with 250ml nonfat milk or soymilk. Blend or shake well.",
-            benefits=["Meal replacement", "High protein", "21 essential nutrients", "Weight management"]
-        )
-        
-        # Personalized Protein Powder
-        products['protein_powder'] = HerbalifeProduct(
-            name="Personalized Protein Powder",
-            albanian_name="Pluhur Proteini i Personalizuar",
-            product_type="supplement",
-            calories=20,
-            protein=5.0,
-            carbs=0.0,
-            fat=0.0,
-            serving_size="1 tablespoon",
-            meal_timing=["breakfast", "lunch", "dinner", "snack"],
-            preparation="Add to shakes, smoothies, or meals to increase protein content.",
-            benefits=["Additional protein", "Muscle support", "Versatile usage"]
-        )
-        
-        # Herbal Tea Concentrate
-        products['herbal_tea'] = HerbalifeProduct(
-            name="Herbal Tea Concentrate",
-            albanian_name="Koncentrat Çaji Bimor",
-            product_type="tea",
-            calories=5,
-            protein=0.0,
-            carbs=1.0,
-            fat=0.0,
-            serving_size="1 teaspoon + 250ml water",
-            meal_timing=["breakfast", "snack"],
-            preparation="Mix 1 teaspoon with 250ml hot water. Steep for 3-5 minutes.",
-            benefits=["Metabolism support", "Antioxidants", "Natural energy"]
-        )
-        
-        # Afresh Energy Drink
-        products['afresh_energy'] = HerbalifeProduct(
-            name="Afresh Energy Drink",
-            albanian_name="Pije Energjie Afresh",
-            product_type="tea",
-            calories=15,
-            protein=0.0,
-            carbs=4.0,
-            fat=0.0,
-            serving_size="1 sachet + 250ml water",
-            meal_timing=["breakfast", "snack"],
-            preparation="Mix 1 sachet with 250ml cold water. Stir well.",
-            benefits=["Natural energy", "Caffeine", "Tulsi extract", "Low calorie"]
-        )
-        
-        # Herbal Aloe Concentrate
-        products['aloe_concentrate'] = HerbalifeProduct(
-            name="Herbal Aloe Concentrate",
-            albanian_name="Koncentrat Aloe Bimor",
-            product_type="supplement",
-            calories=10,
-            protein=0.0,
-            carbs=2.0,
-            fat=0.0,
-            serving_size="2 capfuls + 250ml water",
-            meal_timing=["breakfast", "lunch", "dinner"],
-            preparation="Mix 2 capfuls with 250ml water. Drink throughout the day.",
-            benefits=["Digestive health", "Hydration", "Nutrient absorption"]
-        )
-        
-        # Protein Bars
-        products['protein_bar'] = HerbalifeProduct(
-            name="Protein Bar",
-            albanian_name="Biskotë Proteini",
-            product_type="snack",
-            calories=140,
-            protein=10.0,
-            carbs=15.0,
-            fat=4.0,
-            serving_size="1 bar",
-            meal_timing=["snack"],
-            preparation="Ready to eat. Store in cool, dry place.",
-            benefits=["Convenient protein", "Portable snack", "Satisfying"]
-        )
-        
-        return products
+        self.products = _PRODUCTS
     
     def get_herbalife_recommendations(self, user_profile: Dict, goal: str, 
                                     meal_type: str, target_calories: int) -> List[HerbalifeProduct]:
         """Get professional Herbalife recommendations based on user profile and goals"""
-        recommendations = []
+        if meal_type not in _MAIN_MEALS:
+            meal_type = "snack"
+        candidates = _RECS.get((_GOAL_ALIAS.get(goal), meal_type), ())
         
-        # Weight loss recommendations
-        if goal == "Humbje peshe" or goal == "Weight Loss":
-            if meal_type == "breakfast":
-                # Formula 1 shake for breakfast (most important meal for weight loss)
-                recommendations.append(self.products['formula1_vanilla'])
-                recommendations.append(self.products['herbal_tea'])
-            elif meal_type == "lunch":
-                # Formula 1 shake for lunch (controlled calories)
-                recommendations.append(self.products['formula1_chocolate'])
-                recommendations.append(self.products['aloe_concentrate'])
-            elif meal_type == "dinner":
-                # Light dinner with protein powder
-                recommendations.append(self.products['protein_powder'])
-            else:  # snack
-                recommendations.append(self.products['protein_bar'])
-                recommendations.append(self.products['afresh_energy'])
-        
-        # Weight maintenance recommendations
-        elif goal == "Mbajtje" or goal == "Maintenance":
-            if meal_type == "breakfast":
-                recommendations.append(self.products['formula1_vanilla'])
-                recommendations.append(self.products['herbal_tea'])
-            elif meal_type == "lunch":
-                # Regular lunch with Herbalife supplement
-                recommendations.append(self.products['protein_powder'])
-            elif meal_type == "dinner":
-                # Regular dinner
-                recommendations.append(self.products['aloe_concentrate'])
-            else:  # snack
-                recommendations.append(self.products['protein_bar'])
-        
-        # Muscle building recommendations
-        elif goal == "Shtim muskuj" or goal == "Muscle Building":
-            if meal_type == "breakfast":
-                recommendations.append(self.products['formula1_chocolate'])
-                recommendations.append(self.products['protein_powder'])
-            elif meal_type == "lunch":
-                recommendations.append(self.products['formula1_vanilla'])
-                recommendations.append(self.products['protein_powder'])
-            elif meal_type == "dinner":
-                recommendations.append(self.products['protein_powder'])
-            else:  # snack
-                recommendations.append(self.products['protein_bar'])
-                recommendations.append(self.products['protein_powder'])
-        
-        # Filter by calorie target
-        filtered_recommendations = []
-        for product in recommendations:
-            if product.calories <= target_calories * 0.8:  # Leave room for other foods
-                filtered_recommendations.append(product)
-        
-        return filtered_recommendations[:2]  # Return top 2 recommendations
+        # Leave room for other foods, return top 2 recommendations
+        max_calories = target_calories * 0.8
+        return [product for product in candidates if product.calories <= max_calories][:2]
     
     def create_herbalife_meal_plan(self, user_id: int, goal: str, total_kcal: int, 
                                  pattern: str = "30/40/30") -> Dict:
         """Create a comprehensive Herbalife-integrated meal plan"""
         
         # Calculate calorie distribution
-        try:
-            b, l, d = [int(x) for x in pattern.split("/")]
+        split = _parse_pattern(pattern)
+        if split:
+            b, l, d = split
             factor = total_kcal / (b + l + d)
             calorie_split = {
                 "breakfast": int(round(b * factor)),
                 "lunch": int(round(l * factor)),
                 "dinner": int(round(d * factor)),
             }
-        except:
+        else:
             calorie_split = {"breakfast": int(total_kcal * 0.3), 
                            "lunch": int(total_kcal * 0.4), 
                            "dinner": int(total_kcal * 0.3)}
         
-        # Get user profile - handle case where db might be None or fail
-        try:
-            user = self.db.get_user_by_id(user_id) if self.db else None
-            profile = user.profile_data if user else {}
-        except:
-            profile = {}
-        
         # Create Herbalife meal plan
         herbalife_plan = {
             "breakfast": self._create_herbalife_breakfast(goal, calorie_split["breakfast"]),
@@ -234,101 +302,23 @@ class HerbalifeIntegration:
     
     def _create_herbalife_breakfast(self, goal: str, target_calories: int) -> Dict:
         """Create Herbalife breakfast recommendation"""
-        if goal in ["Humbje peshe", "Weight Loss"]:
-            return {
-                "primary": self.products['formula1_vanilla'],
-                "supplement": self.products['herbal_tea'],
-                "total_calories": self.products['formula1_vanilla'].calories + self.products['herbal_tea'].calories,
-                "recommendation": "Formula 1 shake for breakfast provides controlled calories and essential nutrients. Herbal tea supports metabolism.",
-                "albanian_recommendation": "Formula 1 për mëngjes ofron kalori të kontrolluara dhe lëndë ushqyese thelbësore. Çaji bimor mbështet metabolizmin."
-            }
-        else:
-            return {
-                "primary": self.products['formula1_chocolate'],
-                "supplement": self.products['herbal_tea'],
-                "total_calories": self.products['formula1_chocolate'].calories + self.products['herbal_tea'].calories,
-                "recommendation": "Formula 1 shake provides a nutritious start to your day with high-quality protein.",
-                "albanian_recommendation": "Formula 1 ofron një fillim ushqyes për ditën tuaj me proteinë cilësore të lartë."
-            }
+        return _meal_template(goal, "breakfast")
     
     def _create_herbalife_lunch(self, goal: str, target_calories: int) -> Dict:
         """Create Herbalife lunch recommendation"""
-        if goal in ["Humbje peshe", "Weight Loss"]:
-            return {
-                "primary": self.products['formula1_chocolate'],
-                "supplement": self.products['aloe_concentrate'],
-                "total_calories": self.products['formula1_chocolate'].calories + self.products['aloe_concentrate'].calories,
-                "recommendation": "Formula 1 shake for lunch helps maintain calorie control while providing essential nutrients.",
-                "albanian_recommendation": "Formula 1 për drekë ndihmon në kontrollin e kalorive duke ofruar lëndë ushqyese thelbësore."
-            }
-        else:
-            return {
-                "primary": self.products['protein_powder'],
-                "supplement": self.products['aloe_concentrate'],
-                "total_calories": self.products['protein_powder'].calories + self.products['aloe_concentrate'].calories,
-                "recommendation": "Add protein powder to your regular lunch for extra protein. Aloe supports digestive health.",
-                "albanian_recommendation": "Shtoni pluhurin e proteinës në drekën tuaj të rregullt për proteinë shtesë. Aloe mbështet shëndetin tretësor."
-            }
+        return _meal_template(goal, "lunch")
     
     def _create_herbalife_dinner(self, goal: str, target_calories: int) -> Dict:
         """Create Herbalife dinner recommendation"""
-        if goal in ["Shtim muskuj", "Muscle Building"]:
-            return {
-                "primary": self.products['protein_powder'],
-                "supplement": self.products['aloe_concentrate'],
-                "total_calories": self.products['protein_powder'].calories + self.products['aloe_concentrate'].calories,
-                "recommendation": "Protein powder with dinner supports muscle recovery. Aloe aids digestion.",
-                "albanian_recommendation": "Pluhuri i proteinës me darkën mbështet rikuperimin e muskujve. Aloe ndihmon tretjen."
-            }
-        else:
-            return {
-                "primary": self.products['aloe_concentrate'],
-                "supplement": None,
-                "total_calories": self.products['aloe_concentrate'].calories,
-                "recommendation": "Aloe concentrate supports digestive health and nutrient absorption.",
-                "albanian_recommendation": "Koncentrati i aloe mbështet shëndetin tretësor dhe thithjen e lëndëve ushqyese."
-            }
+        return _meal_template(goal, "dinner")
     
     def _create_herbalife_snacks(self, goal: str, target_calories: int) -> Dict:
         """Create Herbalife snack recommendations"""
-        snacks = []
-        
-        if goal in ["Humbje peshe", "Weight Loss"]:
-            snacks.append(self.products['protein_bar'])
-            snacks.append(self.products['afresh_energy'])
-        else:
-            snacks.append(self.products['protein_bar'])
-            snacks.append(self.products['herbal_tea'])
-        
-        return {
-            "snacks": snacks,
-            "total_calories": sum(s.calories for s in snacks),
-            "recommendation": "Herbalife snacks provide convenient nutrition between meals.",
-            "albanian_recommendation": "Ushqimet e lehta Herbalife ofrojnë ushqim të përshtatshëm midis vakteve."
-        }
-    
-    def get_herbalife_shopping_list(self, herbalife_plan: Dict) -> Dict[str, int]:
-        """Generate Herbalife shopping list"""
-        shopping_list = {}
-        
-        for meal_type, meal_data in herbalife_plan.items():
-            if meal_type == "snacks":
-                for snack in meal_data["snacks"]:
-                    product_name = snack.albanian_name
-                    shopping_list[product_name] = shopping_list.get(product_name, 0) + 1
-            else:
-                if meal_data.get("primary"):
-                    product_name = meal_data["primary"].albanian_name
-                    shopping_list[product_name] = shopping_list.get(product_name, 0) + 1
-                
-                if meal_data.get("supplement"):
-                    product_name = meal_data["supplement"].albanian_name
-                    shopping_list[product_name] = shopping_list.get(product_name, 0) + 1
-        
-        return shopping_list
+        return _meal_template(goal, "snacks")
     
-    def calculate_herbalife_nutrition(self, herbalife_plan: Dict) -> Dict:
-        """Calculate total nutrition from Herbalife plan"""
+    def summarize_plan(self, herbalife_plan: Dict) -> Tuple[Dict[str, int], Dict]:
+        """Build the shopping list and nutrition totals in a single pass over the plan"""
+        shopping_list = defaultdict(int)
         total_calories = 0
         total_protein = 0
         total_carbs = 0
@@ -336,39 +326,88 @@ class HerbalifeIntegration:
         
         for meal_type, meal_data in herbalife_plan.items():
             if meal_type == "snacks":
-                for snack in meal_data["snacks"]:
-                    total_calories += snack.calories
-                    total_protein += snack.protein
-                    total_carbs += snack.carbs
-                    total_fat += snack.fat
+                products = meal_data["snacks"]
             else:
-                if meal_data.get("primary"):
-                    product = meal_data["primary"]
-                    total_calories += product.calories
-                    total_protein += product.protein
-                    total_carbs += product.carbs
-                    total_fat += product.fat
-                
-                if meal_data.get("supplement"):
-                    product = meal_data["supplement"]
-                    total_calories += product.calories
-                    total_protein += product.protein
-                    total_carbs += product.carbs
-                    total_fat += product.fat
+                products = (meal_data.get("primary"), meal_data.get("supplement"))
+            
+            for product in products:
+                if not product:
+                    continue
+                shopping_list[product.albanian_name] += 1
+                calories, protein, carbs, fat = product.macros
+                total_calories += calories
+                total_protein += protein
+                total_carbs += carbs
+                total_fat += fat
         
-        return {
+        nutrition = {
             "calories": total_calories,
             "protein": round(total_protein, 1),
             "carbs": round(total_carbs, 1),
             "fat": round(total_fat, 1)
         }
+        return dict(shopping_list), nutrition
+    
+    def get_herbalife_shopping_list(self, herbalife_plan: Dict) -> Dict[str, int]:
+        """Generate Herbalife shopping list"""
+        return self.summarize_plan(herbalife_plan)[0]
+    
+    def calculate_herbalife_nutrition(self, herbalife_plan: Dict) -> Dict:
+        """Calculate total nutrition from Herbalife plan"""
+        return self.summarize_plan(herbalife_plan)[1]
+
+# Product info shown in the Herbalife page expanders
+_F1_MD = """
+**Përshkrimi**: Përzierje nutritive për zëvendësimin e vakteve
+**Përdorimi**: 2 lugë + 250ml qumësht
+**Përfitimet**:
+- 21 lëndë ushqyese thelbësore
+- Proteinë e lartë (17g)
+- Kontroll i kalorive
+- Përshtatshëm për humbjen e peshës
+"""
+
+_PP_MD = """
+**Përshkrimi**: Pluhur proteini për shtim në ushqime
+**Përdorimi**: 1 lugë në ushqime ose pije
+**Përfitimet**:
+- Proteinë shtesë (5g për lugë)
+- Përdorim i larmishëm
+- Mbështet rritjen e muskujve
+"""
+
+_HT_MD = """
+**Përshkrimi**: Çaj bimor për mbështetjen e metabolizmit
+**Përdorimi**: 1 lugë çaji + 250ml ujë të nxehtë
+**Përfitimet**:
+- Mbështet metabolizmin
+- Antioksidantë
+- Energji natyrore
+"""
+
+@st.cache_resource
+def _get_herbalife(_db_manager: Optional[DatabaseManager], db_path: str) -> HerbalifeIntegration:
+    """One HerbalifeIntegration per database file, reused across reruns"""
+    return HerbalifeIntegration(_db_manager)
+
+@st.cache_data
+def _cached_recs(_herbalife: HerbalifeIntegration, goal: str, meal_type: str,
+                 target_calories: int) -> Tuple[Tuple[str, int, float], ...]:
+    """(albanian_name, calories, protein) for each recommended product"""
+    return tuple(
+        (product.albanian_name, product.calories, product.protein)
+        for product in _herbalife.get_herbalife_recommendations({}, goal, meal_type, target_calories)
+    )
 
 def render_herbalife_integration_ui(user_id: int, db_manager: DatabaseManager, lang: str = "sq"):
     """Render Herbalife integration UI"""
     st.title("🥤 Integrimi Herbalife")
     
-    herbalife = HerbalifeIntegration(db_manager)
-    
+    return _render_herbalife_section(user_id, db_manager)
+
+@st.fragment
+def _render_herbalife_section(user_id: int, db_manager: DatabaseManager):
+    """Herbalife toggle and recommendations; widget changes rerun only this section"""
     # Herbalife integration checkbox
     use_herbalife = st.checkbox(
         "Kombino vaktet me HERBALIFE",
@@ -379,6 +418,8 @@ def render_herbalife_integration_ui(user_id: int, db_manager: DatabaseManager, l
     if use_herbalife:
         st.info("🌿 Herbalife Integration Activated - Your meal plan will include professional Herbalife recommendations")
         
+        herbalife = _get_herbalife(db_manager, db_manager.db_path)
+        
         # Get user profile for recommendations
         user = db_manager.get_user_by_id(user_id)
         if user:
@@ -392,51 +433,27 @@ def render_herbalife_integration_ui(user_id: int, db_manager: DatabaseManager, l
             
             with col1:
                 st.markdown("**Mëngjes**")
-                breakfast_rec = herbalife.get_herbalife_recommendations(profile, goal, "breakfast", 400)
-                for product in breakfast_rec:
-                    st.write(f"• {product.albanian_name}")
-                    st.caption(f"{product.calories} kcal, {product.protein}g proteinë")
+                for name, calories, protein in _cached_recs(herbalife, goal, "breakfast", 400):
+                    st.write(f"• {name}")
+                    st.caption(f"{calories} kcal, {protein}g proteinë")
             
             with col2:
                 st.markdown("**Drekë**")
-                lunch_rec = herbalife.get_herbalife_recommendations(profile, goal, "lunch", 500)
-                for product in lunch_rec:
-                    st.write(f"• {product.albanian_name}")
-                    st.caption(f"{product.calories} kcal, {product.protein}g proteinë")
+                for name, calories, protein in _cached_recs(herbalife, goal, "lunch", 500):
+                    st.write(f"• {name}")
+                    st.caption(f"{calories} kcal, {protein}g proteinë")
             
             # Herbalife product information
             st.subheader("📋 Informacione për Produktet Herbalife")
             
             with st.expander("Formula 1 Nutritional Shake Mix"):
-                st.markdown("""
-                **Përshkrimi**: Përzierje nutritive për zëvendësimin e vakteve
-                **Përdorimi**: 2 lugë + 250ml qumësht
-                **Përfitimet**: 
-                - 21 lëndë ushqyese thelbësore
-                - Proteinë e lartë (17g)
-                - Kontroll i kalorive
-                - Përshtatshëm për humbjen e peshës
-                """)
+                st.markdown(_F1_MD)
             
             with st.expander("Personalized Protein Powder"):
-                st.markdown("""
-                **Përshkrimi**: Pluhur proteini për shtim në ushqime
-                **Përdorimi**: 1 lugë në ushqime ose pije
-                **Përfitimet**:
-                - Proteinë shtesë (5g për lugë)
-                - Përdorim i larmishëm
-                - Mbështet rritjen e muskujve
-                """)
+                st.markdown(_PP_MD)
             
             with st.expander("Herbal Tea Concentrate"):
-                st.markdown("""
-                **Përshkrimi**: Çaj bimor për mbështetjen e metabolizmit
-                **Përdorimi**: 1 lugë çaji + 250ml ujë të nxehtë
-                **Përfitimet**:
-                - Mbështet metabolizmin
-                - Antioksidantë
-                - Energji natyrore
-                """)
+                st.markdown(_HT_MD)
         
         return True
     else:
@@ -1,30 +1,209 @@
 import streamlit as st
-import requests
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import json
 import base64
-from typing import Dict, List, Optional, Tuple
+import hashlib
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import Dict, Final, List, Optional, Tuple, Union
 from database import DatabaseManager
 import os
-from datetime import datetime
 import io
+import numpy as np
 from PIL import Image
 from dotenv import load_dotenv
 
+# Formats the uploader accepts (PIL skips probing every other plugin), and a
+# pixel cap that rejects decompression bombs before anything is decoded
+UPLOAD_FORMATS = ('JPEG', 'PNG')
+MAX_UPLOAD_PIXELS = 50_000_000
+
+# Fallback analysis works on a thumbnail; colour is what matters, not detail
+FALLBACK_THUMBNAIL = (128, 128)
+FALLBACK_PALETTE_SIZE = 16
+MIN_CLASS_SHARE = 0.05  # share of pixels a colour class needs to be reported
+FLAT_IMAGE_SHARE = 0.95  # share of pixels in one colour above which the image is rejected
+
+# Image budget for Vision requests: uploads are downscaled to fit VISION_MAX_SIZE,
+# and "low" detail is a flat ~85 tokens, plenty for naming the foods on a plate
+VISION_MAX_SIZE = (1024, 1024)
+VISION_DETAIL = "low"
+VISION_PASSTHROUGH_BYTES = 512 * 1024  # JPEGs up to this size within VISION_MAX_SIZE are sent unchanged
+
+# Re-encoding for Vision uploads: progressive 4:2:0 JPEG, fewer bytes to base64 and send
+JPEG_QUALITY = 75
+JPEG_SUBSAMPLING = 2  # 4:2:0
+
+# Upper bound on Vision API requests in flight during batch recognition
+MAX_CONCURRENT_VISION_CALLS = 10
+
+# Per-request limits for Vision calls (the client default timeout is 10 minutes)
+VISION_TIMEOUT = 30  # seconds
+VISION_MAX_RETRIES = 2
+
+# Simple nutrition estimation based on common foods
+_NUTRITION_DB = {
+    'chicken': {'calories': 165, 'protein': 31, 'carbs': 0, 'fat': 3.6},
+    'beef': {'calories': 250, 'protein': 26, 'carbs': 0, 'fat': 15},
+    'fish': {'calories': 206, 'protein': 22, 'carbs': 0, 'fat': 12},
+    'rice': {'calories': 130, 'protein': 2.7, 'carbs': 28, 'fat': 0.3},
+    'pasta': {'calories': 131, 'protein': 5, 'carbs': 25, 'fat': 1.1},
+    'bread': {'calories': 265, 'protein': 9, 'carbs': 49, 'fat': 3.2},
+    'vegetables': {'calories': 25, 'protein': 2, 'carbs': 5, 'fat': 0.2},
+    'fruits': {'calories': 60, 'protein': 0.5, 'carbs': 15, 'fat': 0.2},
+    'cheese': {'calories': 113, 'protein': 7, 'carbs': 1, 'fat': 9},
+    'eggs': {'calories': 155, 'protein': 13, 'carbs': 1.1, 'fat': 11}
+}
+_NUTRITION_PRIORITY = {food: i for i, food in enumerate(_NUTRITION_DB)}
+_NUTRITION_MATRIX = np.array(
+    [[v['calories'], v['protein'], v['carbs'], v['fat']] for v in _NUTRITION_DB.values()]
+)
+
+# Matches every nutrition DB key in a food name in one scan
+_NUTRITION_PATTERN = re.compile('|'.join(map(re.escape, _NUTRITION_DB)))
+
+# Colour classes used by the fallback, in rule priority order
+_COLOR_FOODS = (
+    "Green vegetables",
+    "Red food (meat/tomatoes)",
+    "Brown food (bread/meat)",
+    "White food (rice/pasta)",
+)
+_COLOR_CONFIDENCE = (60, 50, 45, 40)
+
+# sRGB (D65) -> XYZ, rows already divided by the reference white
+_RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+]) / np.array([[0.95047], [1.0], [1.08883]])
+
+
+def _rgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """Convert an (..., 3) array of 0-255 sRGB values to CIE L*a*b*"""
+    c = rgb / 255.0
+    linear = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ _RGB_TO_XYZ.T
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    fx, fy, fz = f[..., 0], f[..., 1], f[..., 2]
+    return np.stack([116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz)], axis=-1)
+
+
+@lru_cache(maxsize=None)
+def _lab_lut() -> np.ndarray:
+    """L*a*b* of every 5-bit colour bin centre, indexed [r, g, b]; built on first use"""
+    centres = np.arange(32) * 8 + 4
+    grid = np.stack(np.meshgrid(centres, centres, centres, indexing='ij'), axis=-1)
+    return _rgb_to_lab(grid).astype(np.float32)
+
+logger = logging.getLogger(__name__)
+
 # Load environment variables from .env file
 try:
     load_dotenv()
 except Exception as e:
     print(f"Warning: Could not load .env file: {e}")
 
+# Kept byte-identical across calls so OpenAI's prompt-prefix caching applies
+_VISION_PROMPT: Final[str] = """Analyze this food image and identify:
+1. All visible food items
+2. Estimated portion sizes
+3. Cooking method (raw, cooked, fried, etc.)
+4. Confidence level for each item (0-100%)
+
+Return as JSON with this structure:
+{
+    "foods": [
+        {
+            "name": "food item name",
+            "portion": "estimated portion",
+            "cooking_method": "raw/cooked/fried/etc",
+            "confidence": 85
+        }
+    ]
+}"""
+
+# Raw upload bytes, or an image the caller already opened (e.g. to display it)
+ImageInput = Union[bytes, Image.Image]
+
+def _open_rgb(image: ImageInput, draft_size: Tuple[int, int]) -> Image.Image:
+    """An RGB image safe to resize in place: uploads are opened, PIL images copied"""
+    if isinstance(image, Image.Image):
+        return image.convert('RGB')  # always a new image
+    opened = Image.open(io.BytesIO(image), formats=UPLOAD_FORMATS)
+    if opened.width * opened.height > MAX_UPLOAD_PIXELS:
+        raise ValueError(f"Image is too large ({opened.width}x{opened.height})")
+    # JPEGs decode at the smallest 1/2, 1/4 or 1/8 scale still covering draft_size
+    opened.draft('RGB', draft_size)
+    return opened if opened.mode == 'RGB' else opened.convert('RGB')
+
+def _upload_as_vision_jpeg(image: ImageInput) -> Optional[bytes]:
+    """The raw upload if it is already a JPEG within the Vision byte and size budget"""
+    if not isinstance(image, bytes) or len(image) > VISION_PASSTHROUGH_BYTES:
+        return None
+    if not image.startswith(b'\xff\xd8\xff'):  # JPEG start-of-image marker
+        return None
+    # Only the header is parsed here; the pixels are never decoded
+    with Image.open(io.BytesIO(image), formats=('JPEG',)) as header:
+        width, height = header.size
+    if width <= VISION_MAX_SIZE[0] and height <= VISION_MAX_SIZE[1]:
+        return image
+    return None
+
+def _image_key(image: ImageInput) -> str:
+    """128-bit BLAKE2b of the upload bytes, or of an opened image's mode, size and pixels"""
+    if isinstance(image, Image.Image):
+        digest = hashlib.blake2b(f"{image.mode}:{image.size}:".encode(), digest_size=16)
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+    return hashlib.blake2b(image, digest_size=16).hexdigest()
+
+_JSON_DECODER = json.JSONDecoder()
+_CODE_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+
+def _parse_vision_json(content: str) -> Optional[Dict]:
+    """Find the reply's JSON object, tolerating code fences and text around it"""
+    fenced = _CODE_FENCE.search(content)
+    if fenced:
+        content = fenced.group(1)
+    
+    # Decode from each '{' until one yields an object; prefer one with "foods"
+    first = None
+    start = content.find('{')
+    while start != -1:
+        try:
+            obj, end = _JSON_DECODER.raw_decode(content, start)
+        except json.JSONDecodeError:
+            start = content.find('{', start + 1)
+            continue
+        if isinstance(obj, dict):
+            if 'foods' in obj:
+                return obj
+            first = first or obj
+        start = content.find('{', end)
+    return first
+
 class FoodImageRecognition:
     def __init__(self, db_manager: DatabaseManager):
         self.db = db_manager
         self.api_key = self._get_openai_api_key()
+        self._client = None
+    
+    @property
+    def client(self):
+        """OpenAI client shared by all sync calls, so its HTTP connections are reused"""
+        if self._client is None:
+            import openai
+            self._client = openai.OpenAI(
+                api_key=self.api_key, timeout=VISION_TIMEOUT, max_retries=VISION_MAX_RETRIES
+            )
+        return self._client
     
     def _get_openai_api_key(self):
         """Get OpenAI API key from Streamlit secrets or environment variables"""
         try:
-            import streamlit as st
             # Try Streamlit secrets first (for deployment)
             if hasattr(st, 'secrets') and 'OPENAI_API_KEY' in st.secrets:
                 return st.secrets['OPENAI_API_KEY']
@@ -34,16 +213,19 @@ class FoodImageRecognition:
         # Fallback to environment variable (for local development)
         return os.getenv("OPENAI_API_KEY", "")
     
-    def recognize_food(self, image_data: bytes, user_id: int) -> Dict:
-        """Recognize food in uploaded image"""
+    def recognize_food(self, image: ImageInput, user_id: int) -> Dict:
+        """Recognize food in an uploaded image, given as raw bytes or an opened PIL image"""
         try:
             # Use OpenAI Vision API for food recognition
             if self.api_key:
-                return self._recognize_with_openai(image_data, user_id)
+                cached = self._cached_result(image, user_id)
+                if cached is not None:
+                    return cached
+                return self._recognize_with_openai(image, user_id)
             else:
-                return self._recognize_with_fallback(image_data, user_id)
+                return self._recognize_with_fallback(image, user_id)
         except Exception as e:
-            st.error(f"Food recognition failed: {str(e)}")
+            logger.exception("Food recognition failed")
             return {
                 'success': False,
                 'error': str(e),
@@ -51,109 +233,107 @@ class FoodImageRecognition:
                 'confidence_scores': []
             }
     
-    def _recognize_with_openai(self, image_data: bytes, user_id: int) -> Dict:
+    def _cached_result(self, image: ImageInput, user_id: int) -> Optional[Dict]:
+        """Return (and log) a stored Vision result for an identical image"""
+        result = self.db.get_cached_recognition(_image_key(image))
+        if result is not None:
+            self._log_recognition(user_id, result['recognized_foods'], result['confidence_scores'])
+        return result
+    
+    def _recognize_with_openai(self, image: ImageInput, user_id: int) -> Dict:
         """Recognize food using OpenAI Vision API"""
         try:
-            import openai
-            client = openai.OpenAI(api_key=self.api_key)
-            
-            # Process image and encode to base64
-            from PIL import Image
-            import io
-            
-            # image_data is now raw bytes from uploaded_file.getvalue()
-            image = Image.open(io.BytesIO(image_data))
+            response = self.client.chat.completions.create(**self._vision_request(image))
+            return self._vision_result(response, image, user_id)
+        except Exception:
+            logger.exception("OpenAI recognition failed")
+            return self._recognize_with_fallback(image, user_id)
+    
+    def _vision_request(self, image: ImageInput) -> Dict:
+        """Build the chat completion arguments for one image"""
+        # Small JPEG uploads are sent as they are, without a decode/encode round trip
+        image_bytes = _upload_as_vision_jpeg(image)
+        if image_bytes is None:
+            # Convert to RGB (for JPEG compatibility); also leaves a caller's Image untouched
+            image = _open_rgb(image, VISION_MAX_SIZE)
             
-            # Convert to RGB if necessary (for JPEG compatibility)
-            if image.mode in ('RGBA', 'LA', 'P'):
-                image = image.convert('RGB')
+            # The API downsamples large images anyway, so don't upload the extra pixels;
+            # after the draft decode the remaining step is at most 2x, where bilinear suffices
+            image.thumbnail(VISION_MAX_SIZE, Image.BILINEAR)
             
             # Save to bytes buffer in JPEG format
             buffer = io.BytesIO()
-            image.save(buffer, format='JPEG', quality=85)
-            image_bytes = buffer.getvalue()
-            
-            # Encode image to base64
-            image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-            
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": """Analyze this food image and identify:
-                                1. All visible food items
-                                2. Estimated portion sizes
-                                3. Cooking method (raw, cooked, fried, etc.)
-                                4. Confidence level for each item (0-100%)
-                                
-                                Return as JSON with this structure:
-                                {
-                                    "foods": [
-                                        {
-                                            "name": "food item name",
-                                            "portion": "estimated portion",
-                                            "cooking_method": "raw/cooked/fried/etc",
-                                            "confidence": 85
-                                        }
-                                    ]
-                                }"""
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_base64}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=1000
+            image.save(
+                buffer, format='JPEG', quality=JPEG_QUALITY, subsampling=JPEG_SUBSAMPLING,
+                optimize=True, progressive=True
             )
+            image_bytes = buffer.getbuffer()
+        
+        # Encode image to base64 straight from memory, without a getvalue() copy
+        image_url = "data:image/jpeg;base64," + base64.b64encode(image_bytes).decode('ascii')
+        
+        return {
+            "model": "gpt-4o",
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": _VISION_PROMPT
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": image_url,
+                                "detail": VISION_DETAIL
+                            }
+                        }
+                    ]
+                }
+            ],
+            "max_tokens": 1000
+        }
+    
+    def _vision_result(self, response, image: ImageInput, user_id: int) -> Dict:
+        """Turn a Vision API response into a recognition result"""
+        # Parse response
+        content = response.choices[0].message.content
+        
+        # Extract JSON from response
+        result = _parse_vision_json(content or '')
+        
+        if result is not None:
+            foods = result.get('foods', [])
+            recognized_foods = [food['name'] for food in foods]
+            confidence_scores = [food['confidence'] for food in foods]
             
-            # Parse response
-            content = response.choices[0].message.content
-            
-            # Extract JSON from response
-            json_start = content.find('{')
-            json_end = content.rfind('}') + 1
+            # Log recognition
+            self._log_recognition(user_id, recognized_foods, confidence_scores)
             
-            if json_start != -1 and json_end != -1:
-                json_str = content[json_start:json_end]
-                result = json.loads(json_str)
-                
-                foods = result.get('foods', [])
-                recognized_foods = [food['name'] for food in foods]
-                confidence_scores = [food['confidence'] for food in foods]
-                
-                # Log recognition
-                self._log_recognition(user_id, recognized_foods, confidence_scores)
-                
-                return {
-                    'success': True,
-                    'recognized_foods': recognized_foods,
-                    'confidence_scores': confidence_scores,
-                    'detailed_results': foods
-                }
-            else:
-                return self._recognize_with_fallback(image_data, user_id)
-                
-        except Exception as e:
-            st.error(f"OpenAI recognition failed: {str(e)}")
-            return self._recognize_with_fallback(image_data, user_id)
+            result = {
+                'success': True,
+                'recognized_foods': recognized_foods,
+                'confidence_scores': confidence_scores,
+                'detailed_results': foods
+            }
+            self.db.cache_recognition(_image_key(image), result)
+            return result
+        else:
+            return self._recognize_with_fallback(image, user_id)
     
-    def _recognize_with_fallback(self, image_data: bytes, user_id: int) -> Dict:
+    def _recognize_with_fallback(self, image: ImageInput, user_id: int) -> Dict:
         """Fallback food recognition using simple heuristics"""
         try:
-            # Load image
-            image = Image.open(io.BytesIO(image_data))
+            # Load a small RGB copy of the image
+            image = _open_rgb(image, FALLBACK_THUMBNAIL)
+            image.thumbnail(FALLBACK_THUMBNAIL, Image.NEAREST)
             
-            # Simple color-based food detection
-            colors = image.getcolors(maxcolors=256*256*256)
-            if not colors:
+            # Reduce to a small palette (C octree) and count pixels per entry
+            quantized = image.quantize(colors=FALLBACK_PALETTE_SIZE, method=Image.Quantize.FASTOCTREE)
+            palette = np.array(quantized.getpalette(), dtype=np.uint8).reshape(-1, 3)
+            counts = np.bincount(np.asarray(quantized).ravel(), minlength=len(palette))
+            if not counts.any():
                 return {
                     'success': False,
                     'error': 'Could not analyze image',
@@ -161,46 +341,41 @@ class FoodImageRecognition:
                     'confidence_scores': []
                 }
             
-            # Get dominant colors
-            dominant_colors = sorted(colors, key=lambda x: x[0], reverse=True)[:5]
-            
-            # Simple food detection based on colors
-            recognized_foods = []
-            confidence_scores = []
+            # A single colour covering almost the whole image is not a meal photo
+            if counts.max() > FLAT_IMAGE_SHARE * counts.sum():
+                return {
+                    'success': False,
+                    'error': 'Image appears to be a flat color',
+                    'recognized_foods': [],
+                    'confidence_scores': []
+                }
             
-            for count, color in dominant_colors:
-                r, g, b = color
-                
-                # Green foods (vegetables)
-                if g > r and g > b and g > 100:
-                    recognized_foods.append("Green vegetables")
-                    confidence_scores.append(60)
-                
-                # Red foods (tomatoes, meat)
-                elif r > g and r > b and r > 100:
-                    recognized_foods.append("Red food (meat/tomatoes)")
-                    confidence_scores.append(50)
-                
-                # Brown foods (bread, meat)
-                elif r > 80 and g > 80 and b < 100:
-                    recognized_foods.append("Brown food (bread/meat)")
-                    confidence_scores.append(45)
-                
-                # White foods (rice, pasta)
-                elif r > 150 and g > 150 and b > 150:
-                    recognized_foods.append("White food (rice/pasta)")
-                    confidence_scores.append(40)
+            # Classify every palette entry, which covers every pixel at once
+            r, g, b = (palette >> 3).T
             
-            # Remove duplicates and limit results
-            unique_foods = []
-            unique_confidences = []
-            seen = set()
+            # Classify colours perceptually so shading doesn't change the class
+            lab = _lab_lut()[r, g, b]
+            L, a, b = lab[:, 0], lab[:, 1], lab[:, 2]
+            classes = np.select(
+                [
+                    a < -10,                                         # green foods (vegetables)
+                    (a > 15) & (b > 15),                             # red foods (tomatoes, meat)
+                    (L < 50) & (a > 5) & (b > 20),                   # brown foods (bread, meat)
+                    (L > 80) & (np.abs(a) < 10) & (np.abs(b) < 15),  # white foods (rice, pasta)
+                ],
+                list(range(len(_COLOR_FOODS))),
+                default=-1,
+            )
             
-            for food, conf in zip(recognized_foods, confidence_scores):
-                if food not in seen:
-                    unique_foods.append(food)
-                    unique_confidences.append(conf)
-                    seen.add(food)
+            # Pixels per class; report classes with a real share, largest first
+            matched = classes >= 0
+            class_pixels = np.bincount(
+                classes[matched], weights=counts[matched], minlength=len(_COLOR_FOODS)
+            )
+            classes = np.argsort(class_pixels, kind='stable')[::-1]
+            classes = classes[class_pixels[classes] >= MIN_CLASS_SHARE * counts.sum()].tolist()
+            unique_foods = [_COLOR_FOODS[c] for c in classes]
+            unique_confidences = [_COLOR_CONFIDENCE[c] for c in classes]
             
             # Log recognition
             self._log_recognition(user_id, unique_foods, unique_confidences)
@@ -232,218 +407,185 @@ class FoodImageRecognition:
                         confidence_scores: List[int]):
         """Log food recognition results"""
         try:
-            conn = self.db.db_path
-            import sqlite3
-            conn = sqlite3.connect(conn)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO food_recognition_logs 
-                (user_id, recognized_foods, confidence_scores, created_at)
-                VALUES (?, ?, ?, ?)
-            ''', (
-                user_id,
-                json.dumps(recognized_foods),
-                json.dumps(confidence_scores),
-                datetime.now().isoformat()
-            ))
-            
-            conn.commit()
-            conn.close()
-            
-            # Log analytics event
-            self.db.log_analytics_event(
-                user_id=user_id,
-                event_type='food_recognition',
-                event_data={
-                    'recognized_foods': recognized_foods,
-                    'confidence_scores': confidence_scores
-                }
-            )
-            
-        except Exception as e:
-            st.error(f"Failed to log recognition: {str(e)}")
+            # Also records the food_recognition analytics event
+            self.db.log_food_recognition(user_id, recognized_foods, confidence_scores)
+        except Exception:
+            logger.exception("Failed to log recognition")
     
     def get_recognition_history(self, user_id: int, limit: int = 20) -> List[Dict]:
         """Get user's food recognition history"""
         try:
-            conn = self.db.db_path
-            import sqlite3
-            conn = sqlite3.connect(conn)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT recognized_foods, confidence_scores, created_at
-                FROM food_recognition_logs 
-                WHERE user_id = ?
-                ORDER BY created_at DESC
-                LIMIT ?
-            ''', (user_id, limit))
-            
-            history = []
-            for row in cursor.fetchall():
-                history.append({
-                    'recognized_foods': json.loads(row[0] or '[]'),
-                    'confidence_scores': json.loads(row[1] or '[]'),
-                    'created_at': datetime.fromisoformat(row[2])
-                })
-            
-            conn.close()
-            return history
-            
-        except Exception as e:
-            st.error(f"Failed to get recognition history: {str(e)}")
+            return self.db.get_food_recognition_logs(user_id, limit)
+        except Exception:
+            logger.exception("Failed to get recognition history")
             return []
     
     def estimate_nutrition(self, recognized_foods: List[str], 
                           confidence_scores: List[int]) -> Dict:
         """Estimate nutrition for recognized foods"""
-        # Simple nutrition estimation based on common foods
-        nutrition_db = {
-            'chicken': {'calories': 165, 'protein': 31, 'carbs': 0, 'fat': 3.6},
-            'beef': {'calories': 250, 'protein': 26, 'carbs': 0, 'fat': 15},
-            'fish': {'calories': 206, 'protein': 22, 'carbs': 0, 'fat': 12},
-            'rice': {'calories': 130, 'protein': 2.7, 'carbs': 28, 'fat': 0.3},
-            'pasta': {'calories': 131, 'protein': 5, 'carbs': 25, 'fat': 1.1},
-            'bread': {'calories': 265, 'protein': 9, 'carbs': 49, 'fat': 3.2},
-            'vegetables': {'calories': 25, 'protein': 2, 'carbs': 5, 'fat': 0.2},
-            'fruits': {'calories': 60, 'protein': 0.5, 'carbs': 15, 'fat': 0.2},
-            'cheese': {'calories': 113, 'protein': 7, 'carbs': 1, 'fat': 9},
-            'eggs': {'calories': 155, 'protein': 13, 'carbs': 1.1, 'fat': 11}
-        }
-        
-        total_calories = 0
-        total_protein = 0
-        total_carbs = 0
-        total_fat = 0
+        indices = []
+        factors = []
         
         for food, confidence in zip(recognized_foods, confidence_scores):
-            food_lower = food.lower()
-            
-            # Find matching nutrition data
-            for db_food, nutrition in nutrition_db.items():
-                if db_food in food_lower:
-                    # Adjust by confidence
-                    factor = confidence / 100.0
-                    
-                    total_calories += nutrition['calories'] * factor
-                    total_protein += nutrition['protein'] * factor
-                    total_carbs += nutrition['carbs'] * factor
-                    total_fat += nutrition['fat'] * factor
-                    break
+            # Find matching nutrition data, earliest DB entry wins
+            matches = _NUTRITION_PATTERN.findall(food.lower())
+            if matches:
+                indices.append(min(_NUTRITION_PRIORITY[m] for m in matches))
+                # Adjust by confidence
+                factors.append(confidence / 100.0)
+        
+        calories, protein, carbs, fat = (
+            np.asarray(factors) @ _NUTRITION_MATRIX[indices] if indices else np.zeros(4)
+        ).tolist()
         
         return {
-            'calories': round(total_calories),
-            'protein': round(total_protein, 1),
-            'carbs': round(total_carbs, 1),
-            'fat': round(total_fat, 1)
+            'calories': round(calories),
+            'protein': round(protein, 1),
+            'carbs': round(carbs, 1),
+            'fat': round(fat, 1)
+        }
+
+@st.cache_resource
+def _get_recognizer(_db_manager: DatabaseManager, db_path: str) -> FoodImageRecognition:
+    """One FoodImageRecognition per database file, reused across reruns"""
+    return FoodImageRecognition(_db_manager)
+
+def _recognize_uploads(recognition: FoodImageRecognition, images: List[bytes],
+                       user_id: int, label: str) -> List[Dict]:
+    """Recognize several uploads in parallel threads, in upload order, with a progress bar"""
+    progress = st.progress(0.0, text=label)
+    results: List[Optional[Dict]] = [None] * len(images)
+    # Workers carry the script context so session-state storage works inside them
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_VISION_CALLS,
+                            initializer=add_script_run_ctx, initargs=(None, ctx)) as executor:
+        futures = {
+            executor.submit(recognition.recognize_food, image, user_id): index
+            for index, image in enumerate(images)
         }
+        for done, future in enumerate(as_completed(futures), start=1):
+            results[futures[future]] = future.result()
+            progress.progress(done / len(images), text=label)
+    progress.empty()
+    return results
 
 def render_image_recognition_ui(user_id: int, db_manager: DatabaseManager, lang: str = "en"):
     """Render image recognition UI"""
     if lang == "sq":
         st.title("📸 Njohja e Ushqimit")
         
-        recognition = FoodImageRecognition(db_manager)
+        recognition = _get_recognizer(db_manager, db_manager.db_path)
         
         # Upload image
         st.subheader("Ngarko Foto të Ushqimit")
         
-        uploaded_file = st.file_uploader(
-            "Zgjidh një foto të ushqimit",
+        uploaded_files = st.file_uploader(
+            "Zgjidh një ose më shumë foto të ushqimit",
             type=['png', 'jpg', 'jpeg'],
+            accept_multiple_files=True,
             help="Ngarko një foto të qartë të ushqimit për të marrë informacion për ushqyerjen"
         )
     else:
         st.title("📸 Food Recognition")
         
-        recognition = FoodImageRecognition(db_manager)
+        recognition = _get_recognizer(db_manager, db_manager.db_path)
         
         # Upload image
         st.subheader("Upload Food Image")
         
-        uploaded_file = st.file_uploader(
-            "Choose an image of food",
+        uploaded_files = st.file_uploader(
+            "Choose one or more images of food",
             type=['png', 'jpg', 'jpeg'],
+            accept_multiple_files=True,
             help="Upload a clear image of food to get nutrition information"
         )
     
-    if uploaded_file is not None:
-        # Get image data first
-        image_data = uploaded_file.getvalue()
+    if uploaded_files:
+        # Raw upload bytes: st.image sends them as-is, and the recognizer only
+        # decodes them when it has to (small JPEGs go to the API untouched)
+        images = [uploaded_file.getvalue() for uploaded_file in uploaded_files]
         
-        # Display image
-        image = Image.open(io.BytesIO(image_data))
+        # Display images
         if lang == "sq":
-            st.image(image, caption="Foto e Ngarkuar", width='stretch')
+            st.image(images, caption=["Foto e Ngarkuar"] * len(images), width='stretch')
         else:
-            st.image(image, caption="Uploaded Image", width='stretch')
+            st.image(images, caption=["Uploaded Image"] * len(images), width='stretch')
         
         # Recognize food
         if lang == "sq":
             if st.button("Njoh Ushqimin"):
-                with st.spinner("Po analizoj imazhin..."):
-                    result = recognition.recognize_food(image_data, user_id)
+                results = _recognize_uploads(recognition, images, user_id, "Po analizoj imazhet...")
                 
-                if result['success']:
-                    st.success("✅ Njohja e ushqimit u përfundua!")
-                    
-                    # Display results
-                    col1, col2 = st.columns(2)
+                for image_data, result in zip(images, results):
+                    if len(images) > 1:
+                        st.image(image_data, width=200)
                     
-                    with col1:
-                        st.subheader("Ushqime të Njohura")
-                        for i, (food, confidence) in enumerate(zip(
-                            result['recognized_foods'], 
-                            result['confidence_scores']
-                        )):
-                            st.write(f"• {food} ({confidence}% besueshmëri)")
-                    
-                    with col2:
-                        st.subheader("Ushqyerja e Vlerësuar")
-                        nutrition = recognition.estimate_nutrition(
-                            result['recognized_foods'],
-                            result['confidence_scores']
-                        )
+                    if result['success']:
+                        st.success("✅ Njohja e ushqimit u përfundua!")
+                        
+                        # Display results
+                        col1, col2 = st.columns(2)
+                        
+                        with col1:
+                            st.subheader("Ushqime të Njohura")
+                            for i, (food, confidence) in enumerate(zip(
+                                result['recognized_foods'], 
+                                result['confidence_scores']
+                            )):
+                                st.write(f"• {food} ({confidence}% besueshmëri)")
+                        
+                        with col2:
+                            st.subheader("Ushqyerja e Vlerësuar")
+                            nutrition = recognition.estimate_nutrition(
+                                result['recognized_foods'],
+                                result['confidence_scores']
+                            )
+                    else:
+                        st.error(f"Njohja dështoi: {result.get('error', 'Gabim i panjohur')}")
         else:
             if st.button("Recognize Food"):
-                with st.spinner("Analyzing image..."):
-                    result = recognition.recognize_food(image_data, user_id)
+                results = _recognize_uploads(recognition, images, user_id, "Analyzing images...")
                 
-                if result['success']:
-                    st.success("Food recognition completed!")
-                    
-                    # Display results
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        st.subheader("Recognized Foods")
-                        for i, (food, confidence) in enumerate(zip(
-                            result['recognized_foods'], 
-                            result['confidence_scores']
-                        )):
-                            st.write(f"• {food} ({confidence}% confidence)")
+                for image_data, result in zip(images, results):
+                    if len(images) > 1:
+                        st.image(image_data, width=200)
                     
-                    with col2:
-                        st.subheader("Estimated Nutrition")
-                        nutrition = recognition.estimate_nutrition(
-                            result['recognized_foods'],
-                            result['confidence_scores']
-                        )
-                    
-                    st.metric("Kalori", nutrition['calories'])
-                    st.metric("Proteina", f"{nutrition['protein']}g")
-                    st.metric("Karbohidratet", f"{nutrition['carbs']}g")
-                    st.metric("Yndyrnat", f"{nutrition['fat']}g")
-                
-                # Detailed results
-                if 'detailed_results' in result:
-                    st.subheader("Detailed Analysis")
-                    for food_data in result['detailed_results']:
-                        with st.expander(f"{food_data['name']} - {food_data['confidence']}% confidence"):
-                            st.write(f"**Portion:** {food_data['portion']}")
-                            st.write(f"**Cooking Method:** {food_data['cooking_method']}")
-                            st.write(f"**Confidence:** {food_data['confidence']}%")
+                    if result['success']:
+                        st.success("Food recognition completed!")
+                        
+                        # Display results
+                        col1, col2 = st.columns(2)
+                        
+                        with col1:
+                            st.subheader("Recognized Foods")
+                            for i, (food, confidence) in enumerate(zip(
+                                result['recognized_foods'], 
+                                result['confidence_scores']
+                            )):
+                                st.write(f"• {food} ({confidence}% confidence)")
+                        
+                        with col2:
+                            st.subheader("Estimated Nutrition")
+                            nutrition = recognition.estimate_nutrition(
+                                result['recognized_foods'],
+                                result['confidence_scores']
+                            )
+                        
+                        st.metric("Kalori", nutrition['calories'])
+                        st.metric("Proteina", f"{nutrition['protein']}g")
+                        st.metric("Karbohidratet", f"{nutrition['carbs']}g")
+                        st.metric("Yndyrnat", f"{nutrition['fat']}g")
+                        
+                        # Detailed results
+                        if 'detailed_results' in result:
+                            st.subheader("Detailed Analysis")
+                            for food_data in result['detailed_results']:
+                                with st.expander(f"{food_data['name']} - {food_data['confidence']}% confidence"):
+                                    st.write(f"**Portion:** {food_data['portion']}")
+                                    st.write(f"**Cooking Method:** {food_data['cooking_method']}")
+                                    st.write(f"**Confidence:** {food_data['confidence']}%")
+                    else:
+                        st.error(f"Recognition failed: {result.get('error', 'Unknown error')}")
                 
                 # Add to meal plan option
                 st.subheader("Add to Meal Plan")
@@ -456,8 +598,6 @@ def render_image_recognition_ui(user_id: int, db_manager: DatabaseManager, lang:
                 if st.button("Add to Today's Plan"):
                     st.info("This would add the recognized food to your meal plan")
                     # Implementation would go here
-            else:
-                st.error(f"Recognition failed: {result.get('error', 'Unknown error')}")
     
     # Recognition history
     st.subheader("Recognition History")
@@ -1,12 +1,16 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from database import DatabaseManager, NutritionReport
 import json
 
+# Recipe fields summed into the weekly totals, in report order
+MACRO_KEYS = ('kcal', 'protein', 'carbs', 'fat')
+
 class NutritionReportGenerator:
     def __init__(self, db_manager: DatabaseManager):
         self.db = db_manager
@@ -15,36 +19,24 @@ class NutritionReportGenerator:
                              meal_plans: List[Dict], progress_data: Dict = None) -> NutritionReport:
         """Generate comprehensive weekly nutrition report"""
         
-        # Calculate nutrition totals for the week
-        total_calories = 0
-        total_protein = 0
-        total_carbs = 0
-        total_fat = 0
-        days_with_meals = 0
-        
-        for plan in meal_plans:
-            if plan.get('plan_data'):
-                plan_data = plan['plan_data']
-                for day, meals in plan_data.items():
-                    if isinstance(meals, dict):
-                        day_calories = 0
-                        day_protein = 0
-                        day_carbs = 0
-                        day_fat = 0
-                        
-                        for meal_type, recipe in meals.items():
-                            if recipe and isinstance(recipe, dict):
-                                day_calories += recipe.get('kcal', 0)
-                                day_protein += recipe.get('protein', 0)
-                                day_carbs += recipe.get('carbs', 0)
-                                day_fat += recipe.get('fat', 0)
-                        
-                        if day_calories > 0:
-                            total_calories += day_calories
-                            total_protein += day_protein
-                            total_carbs += day_carbs
-                            total_fat += day_fat
-                            days_with_meals += 1
+        # One [kcal, protein, carbs, fat] row per recipe, tagged with its day
+        macros, day_ids = [], []
+        days = (
+            meals for plan in meal_plans if plan.get('plan_data')
+            for meals in plan['plan_data'].values() if isinstance(meals, dict)
+        )
+        for day_id, meals in enumerate(days):
+            for recipe in meals.values():
+                if recipe and isinstance(recipe, dict):
+                    macros.append([recipe.get(key, 0) for key in MACRO_KEYS])
+                    day_ids.append(day_id)
+        
+        # Sum per day, then over the days that have any calories
+        day_totals = np.zeros((max(day_ids, default=-1) + 1, len(MACRO_KEYS)))
+        np.add.at(day_totals, day_ids, np.array(macros, dtype=np.float64).reshape(-1, len(MACRO_KEYS)))
+        day_totals = day_totals[day_totals[:, 0] > 0]
+        days_with_meals = len(day_totals)
+        total_calories, total_protein, total_carbs, total_fat = day_totals.sum(axis=0).tolist()
         
         # Calculate averages
         avg_daily_calories = total_calories / max(days_with_meals, 1)
@@ -72,7 +64,7 @@ class NutritionReportGenerator:
         
         # Create nutrition report
         nutrition_data = {
-            'total_calories': total_calories,
+            'total_calories': int(total_calories),
             'avg_daily_calories': int(avg_daily_calories),
             'protein_avg': round(protein_avg, 1),
             'carbs_avg': round(carbs_avg, 1),
@@ -87,6 +79,7 @@ class NutritionReportGenerator:
             nutrition_data=nutrition_data,
             recommendations=recommendations
         )
+        _cached_reports.clear()  # the dashboard should show the new report straight away
         
         return report
     
@@ -183,12 +176,84 @@ class NutritionReportGenerator:
         
         return recommendations
 
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_reports(_db_manager: DatabaseManager, db_path: str, user_id: int) -> List[NutritionReport]:
+    """A user's latest reports, reused across dashboard reruns"""
+    return _db_manager.get_nutrition_reports(user_id, limit=12)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _trends_figure(user_id: int, report_key: Tuple[Tuple[datetime, datetime], ...],
+                   _reports: List[NutritionReport]) -> go.Figure:
+    """Nutrition trends chart, built once per distinct set of reports; each caller gets its own copy"""
+    # Prepare data for plotting, oldest week first, built column by column
+    history = _reports[::-1]
+    df = pd.DataFrame({
+        'Week': [report.week_start.strftime('%Y-%m-%d') for report in history],
+        'Calories': [report.avg_daily_calories for report in history],
+        'Protein': [report.protein_avg for report in history],
+        'Carbs': [report.carbs_avg for report in history],
+        'Fat': [report.fat_avg for report in history]
+    })
+    
+    # Create line chart
+    fig = go.Figure()
+    
+    fig.add_trace(go.Scatter(
+        x=df['Week'],
+        y=df['Calories'],
+        mode='lines+markers',
+        name='Calories',
+        line=dict(color='#FF6B6B')
+    ))
+    
+    fig.add_trace(go.Scatter(
+        x=df['Week'],
+        y=df['Protein'],
+        mode='lines+markers',
+        name='Protein (g)',
+        line=dict(color='#4ECDC4'),
+        yaxis='y2'
+    ))
+    
+    fig.add_trace(go.Scatter(
+        x=df['Week'],
+        y=df['Carbs'],
+        mode='lines+markers',
+        name='Carbs (g)',
+        line=dict(color='#45B7D1'),
+        yaxis='y2'
+    ))
+    
+    fig.add_trace(go.Scatter(
+        x=df['Week'],
+        y=df['Fat'],
+        mode='lines+markers',
+        name='Fat (g)',
+        line=dict(color='#96CEB4'),
+        yaxis='y2'
+    ))
+    
+    fig.update_layout(
+        title="Nutrition Trends",
+        xaxis_title="Week",
+        yaxis=dict(title="Calories", side="left"),
+        yaxis2=dict(title="Macros (g)", side="right", overlaying="y"),
+        hovermode='x unified'
+    )
+    
+    return fig
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def _report_csv(user_id: int, report_key: Tuple[Tuple[datetime, datetime], ...], _report_df: pd.DataFrame) -> bytes:
+    """CSV download for a report table, encoded once per distinct set of reports"""
+    return _report_df.to_csv(index=False).encode('utf-8')
+
 def render_nutrition_dashboard(user_id: int, db_manager: DatabaseManager, lang: str = "en"):
     """Render comprehensive nutrition dashboard"""
     st.title("📊 Nutrition Dashboard")
     
     # Get user's recent reports
-    reports = db_manager.get_nutrition_reports(user_id, limit=12)
+    reports = _cached_reports(db_manager, db_manager.db_path, user_id)
     
     if not reports:
         st.info("No nutrition reports available yet. Generate some meal plans to see your progress!")
@@ -196,6 +261,8 @@ def render_nutrition_dashboard(user_id: int, db_manager: DatabaseManager, lang:
     
     # Latest report
     latest_report = reports[0]
+    # Reports are never edited, so (week, created) identifies the set being shown
+    report_key = tuple((report.week_start, report.created_at) for report in reports)
     
     # Key metrics
     col1, col2, col3, col4 = st.columns(4)
@@ -256,87 +323,26 @@ def render_nutrition_dashboard(user_id: int, db_manager: DatabaseManager, lang:
     if len(reports) > 1:
         st.subheader("📈 Trends Over Time")
         
-        # Prepare data for plotting
-        df_data = []
-        for report in reversed(reports):
-            df_data.append({
-                'Week': report.week_start.strftime('%Y-%m-%d'),
-                'Calories': report.avg_daily_calories,
-                'Protein': report.protein_avg,
-                'Carbs': report.carbs_avg,
-                'Fat': report.fat_avg
-            })
-        
-        df = pd.DataFrame(df_data)
-        
-        # Create line chart
-        fig = go.Figure()
-        
-        fig.add_trace(go.Scatter(
-            x=df['Week'],
-            y=df['Calories'],
-            mode='lines+markers',
-            name='Calories',
-            line=dict(color='#FF6B6B')
-        ))
-        
-        fig.add_trace(go.Scatter(
-            x=df['Week'],
-            y=df['Protein'],
-            mode='lines+markers',
-            name='Protein (g)',
-            line=dict(color='#4ECDC4'),
-            yaxis='y2'
-        ))
-        
-        fig.add_trace(go.Scatter(
-            x=df['Week'],
-            y=df['Carbs'],
-            mode='lines+markers',
-            name='Carbs (g)',
-            line=dict(color='#45B7D1'),
-            yaxis='y2'
-        ))
-        
-        fig.add_trace(go.Scatter(
-            x=df['Week'],
-            y=df['Fat'],
-            mode='lines+markers',
-            name='Fat (g)',
-            line=dict(color='#96CEB4'),
-            yaxis='y2'
-        ))
-        
-        fig.update_layout(
-            title="Nutrition Trends",
-            xaxis_title="Week",
-            yaxis=dict(title="Calories", side="left"),
-            yaxis2=dict(title="Macros (g)", side="right", overlaying="y"),
-            hovermode='x unified'
-        )
-        
-        st.plotly_chart(fig, width='stretch')
+        # The chart is only built and sent when asked for
+        if st.toggle("Show trends", key="nutrition_trends"):
+            st.plotly_chart(_trends_figure(user_id, report_key, reports), width='stretch')
     
     # Detailed breakdown
     st.subheader("📋 Detailed Breakdown")
     
     with st.expander("View All Reports"):
-        report_data = []
-        for report in reports:
-            report_data.append({
-                'Week': report.week_start.strftime('%Y-%m-%d'),
-                'Calories': report.avg_daily_calories,
-                'Protein': f"{report.protein_avg:.1f}g",
-                'Carbs': f"{report.carbs_avg:.1f}g",
-                'Fat': f"{report.fat_avg:.1f}g",
-                'Weight Change': f"{report.weight_change:.1f}kg"
-            })
-        
-        report_df = pd.DataFrame(report_data)
+        report_df = pd.DataFrame({
+            'Week': [report.week_start.strftime('%Y-%m-%d') for report in reports],
+            'Calories': [report.avg_daily_calories for report in reports],
+            'Protein': [f"{report.protein_avg:.1f}g" for report in reports],
+            'Carbs': [f"{report.carbs_avg:.1f}g" for report in reports],
+            'Fat': [f"{report.fat_avg:.1f}g" for report in reports],
+            'Weight Change': [f"{report.weight_change:.1f}kg" for report in reports]
+        })
         st.dataframe(report_df, width='stretch')
         
         # Download button
-        csv = report_df.to_csv(index=False)
+        csv = _report_csv(user_id, report_key, report_df)
         st.download_button(
             "Download Nutrition Report (CSV)",
             data=csv,
@@ -1,11 +1,17 @@
 from __future__ import annotations
-from typing import List, Dict, Any, Optional
-from pydantic import BaseModel
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from functools import cached_property, lru_cache
+from typing import List, Dict, Any, Optional, Tuple
 import random
 import math
+import re
+import numpy as np
 from ai_helpers import enrich_recipe_with_portions
 
-class Recipe(BaseModel):
+@dataclass
+class Recipe:
     name: str
     meal_type: str  # breakfast/lunch/dinner
     kcal: int
@@ -16,6 +22,37 @@ class Recipe(BaseModel):
     ingredients: List[str]
     steps: List[str]
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> Recipe:
+        """Build a Recipe from loaded or AI-generated JSON, ignoring unknown keys."""
+        return cls(
+            name=str(data["name"]),
+            meal_type=str(data["meal_type"]),
+            kcal=int(float(data["kcal"])),
+            protein=int(float(data["protein"])),
+            carbs=int(float(data["carbs"])),
+            fat=int(float(data["fat"])),
+            tags=list(data.get("tags") or []),
+            ingredients=list(data.get("ingredients") or []),
+            steps=list(data.get("steps") or []),
+        )
+
+    @cached_property
+    def search_text(self) -> str:
+        """Lowercased name and ingredients, built on first use for keyword matching."""
+        return " ".join([self.name] + self.ingredients).lower()
+
+    @cached_property
+    def tag_set(self) -> frozenset[str]:
+        """Tags as a set, built on first use for overlap checks."""
+        return frozenset(self.tags)
+
+# Tags that earn a recipe the cooking skill bonus
+SKILL_TAGS: Dict[str, frozenset[str]] = {
+    "beginner": frozenset({"quick", "easy", "simple"}),
+    "advanced": frozenset({"complex", "advanced", "gourmet"}),
+}
+
 DAYS = ["E Hënë","E Martë","E Mërkurë","E Enjte","E Premte","E Shtunë","E Diel"]
 
 # ---------- Filtering ----------
@@ -26,62 +63,75 @@ def filter_recipes(
     include_tags: List[str],
     exclude_keywords: List[str],
 ) -> List[Recipe]:
+    # all exclude keywords in one alternation, so each recipe is scanned once
+    excluded = [re.escape(bad.lower()) for bad in exclude_keywords if bad.strip()]
+    exclude_re = re.compile("|".join(excluded)) if excluded else None
+
     def ok(r: Recipe) -> bool:
         if r.meal_type != meal_type:
             return False
         # hard exclude on name/ingredients
-        text = (r.name + " " + " ".join(r.ingredients)).lower()
-        for bad in exclude_keywords:
-            if bad.strip() and bad.lower() in text:
-                return False
-        return True
+        if exclude_re is None:
+            return True
+        return exclude_re.search(r.search_text) is None
 
     pool = [r for r in recipes if ok(r)]
     if include_tags:
-        preferred = [r for r in pool if any(t in r.tags for t in include_tags)]
+        preferred = [r for r in pool if not r.tag_set.isdisjoint(include_tags)]
         return preferred if preferred else pool
     return pool
 
 # ---------- Energy split ----------
 
-def kcal_target_split(total_kcal: int, pattern: str = "30/40/30") -> Dict[str, int]:
+# Position of each meal in the tuple returned by kcal_target_split
+MEAL_INDEX = {"breakfast": 0, "lunch": 1, "dinner": 2}
+
+@lru_cache(maxsize=32)
+def kcal_target_split(total_kcal: int, pattern: str = "30/40/30") -> Tuple[int, int, int]:
     # pattern is B/L/D percentage
     try:
         b, l, d = [int(x) for x in pattern.split("/")]
         factor = total_kcal / (b + l + d)
-        return {
-            "breakfast": int(round(b * factor)),
-            "lunch": int(round(l * factor)),
-            "dinner": int(round(d * factor)),
-        }
+        return (
+            int(round(b * factor)),
+            int(round(l * factor)),
+            int(round(d * factor)),
+        )
     except Exception:
         # fallback 30/40/30
         return kcal_target_split(total_kcal, "30/40/30")
 
 # ---------- Diversity helpers ----------
 
+# Earlier keywords win when a recipe mentions several
+_PROTEIN_KEYWORDS = [
+    "chicken","pulë","pule",
+    "beef","viç","vici",
+    "pork","derr",
+    "turkey","gjeldeti",
+    "fish","peshk","tuna","salmon","troftë","sarde",
+    "shrimp","karkalec",
+    "egg","vezë","veze",
+    "tofu","tempeh",
+    "beans","fasule","chickpea","qiqra","lentil","thjerrëz","thjerrez",
+    "cheese","djath","yogurt","kos"
+]
+_PROTEIN_RANK = {k: i for i, k in enumerate(_PROTEIN_KEYWORDS)}
+_PROTEIN_OTHER = len(_PROTEIN_KEYWORDS)  # protein id when no keyword matches
+# zero-width lookahead: one scan finds every keyword occurrence, even overlapping ones
+_PROTEIN_RE = re.compile("(?=(" + "|".join(map(re.escape, _PROTEIN_KEYWORDS)) + "))")
+
 def _main_protein(r: Recipe) -> str:
     """Guess the main protein from name/ingredients/tags."""
-    keywords = [
-        "chicken","pulë","pule",
-        "beef","viç","vici",
-        "pork","derr",
-        "turkey","gjeldeti",
-        "fish","peshk","tuna","salmon","troftë","sarde",
-        "shrimp","karkalec",
-        "egg","vezë","veze",
-        "tofu","tempeh",
-        "beans","fasule","chickpea","qiqra","lentil","thjerrëz","thjerrez",
-        "cheese","djath","yogurt","kos"
-    ]
-    hay = " ".join([r.name] + r.ingredients + r.tags).lower()
-    for k in keywords:
-        if k in hay:
-            return k
-    return "other"
+    hay = r.search_text + " " + " ".join(r.tags).lower()
+    found = _PROTEIN_RE.findall(hay)
+    return min(found, key=_PROTEIN_RANK.__getitem__) if found else "other"
 
 # ---------- Planner ----------
 
+# Softmax temperature for picking a recipe: lower sticks closer to the best score
+PICK_TEMPERATURE = 0.5
+
 def make_week_plan(
     recipes: List[Recipe],
     total_kcal: int,
@@ -101,7 +151,7 @@ def make_week_plan(
       - Penalizes repeating the same main protein too often
       - Penalizes repeating yesterday’s protein for the *same* meal
       - Rewards preference-tag overlap
-      - Chooses among the top-K with a bit of randomness
+      - Picks at random, weighted by a softmax over the scores
       - If pool is empty OR sometimes for variety, generates a new AI recipe
       - Saves AI recipes directly into recipes.json (de-duped)
     """
@@ -109,48 +159,62 @@ def make_week_plan(
     split = kcal_target_split(total_kcal, pattern)
     plan: Dict[str, Dict[str, Optional[Recipe]]] = {}
 
-    used_names_global: set[str] = set()                          # prevent exact duplicates in a week
-    used_names_by_meal: Dict[str, set[str]] = {m: set() for m in ["breakfast", "lunch", "dinner"]}
-    protein_count: Dict[str, int] = {}                            # global protein usage
-    last_protein_for_meal: Dict[str, str] = {"breakfast": "", "lunch": "", "dinner": ""}
+    include_set = frozenset(include_tags or ())
+    skill_set = SKILL_TAGS.get(cooking_skill, frozenset())
+    protein_count = np.zeros(_PROTEIN_OTHER + 1, dtype=np.int64)  # global protein usage, by protein id
+    last_protein_for_meal: Dict[str, int] = {"breakfast": -1, "lunch": -1, "dinner": -1}
+    proteins: Dict[int, int] = {}                                 # id(recipe) -> main protein id, guessed once
+
+    def _protein(r: Recipe) -> int:
+        key = id(r)
+        if key not in proteins:
+            proteins[key] = _PROTEIN_RANK.get(_main_protein(r), _PROTEIN_OTHER)
+        return proteins[key]
+
+    # learned preferences as (lowercased item, score bonus), worked out once per plan
+    pref_bonuses = [
+        (
+            pref_item.lower(),
+            # Bonus for liked foods, penalty for disliked, scaled by confidence from the rating count
+            (pref_data.get('avg_rating', 3.0) - 3.0) * 0.2 * min(pref_data.get('count', 1) / 5.0, 1.0),
+        )
+        for pref_item, pref_data in (user_preferences or {}).items()
+    ]
+    ingredient_bonus: Dict[str, float] = {}                       # main ingredient name -> summed bonus
 
-    def _score(r: Recipe, meal_type: str) -> float:
+    def _preference_bonus(r: Recipe) -> float:
+        total = 0.0
+        for ingredient in r.ingredients:
+            words = ingredient.lower().split()
+            if not words:
+                continue
+            ingredient_name = words[0]  # Get main ingredient name
+            if ingredient_name not in ingredient_bonus:
+                ingredient_bonus[ingredient_name] = sum(
+                    bonus for pref_item, bonus in pref_bonuses
+                    if ingredient_name in pref_item or pref_item in ingredient_name
+                )
+            total += ingredient_bonus[ingredient_name]
+        return total
+
+    def _static_score(r: Recipe, meal_type: str) -> float:
+        """The part of a recipe's score that doesn't change during the week."""
         # 1) closeness to kcal target
-        kcal_pen = abs(r.kcal - split[meal_type]) / 10.0   # every 10 kcal off = -1
-        s = -kcal_pen
-
-        # 2) never repeat exactly the same recipe
-        if r.name in used_names_global or r.name in used_names_by_meal[meal_type]:
-            s -= 100.0
+        s = -abs(r.kcal - split[MEAL_INDEX[meal_type]]) / 10.0   # every 10 kcal off = -1
 
-        # 3) protein diversity
-        prot = _main_protein(r)
-        s -= protein_count.get(prot, 0) * 0.8               # global repetition penalty
-        if last_protein_for_meal[meal_type] == prot:
-            s -= 0.8                                        # avoid same protein as yesterday for this meal
+        # 2) reward preference-tag overlap
+        if include_set:
+            s += 0.3 * len(r.tag_set & include_set)
 
-        # 4) reward preference-tag overlap
-        if include_tags:
-            overlap = len(set(r.tags) & set(include_tags))
-            s += 0.3 * overlap
-
-        # 5) user preference learning bonus
+        # 3) user preference learning bonus
         if user_preferences:
-            for ingredient in r.ingredients:
-                ingredient_name = ingredient.lower().split()[0]  # Get main ingredient name
-                for pref_item, pref_data in user_preferences.items():
-                    if ingredient_name in pref_item.lower() or pref_item.lower() in ingredient_name:
-                        rating = pref_data.get('avg_rating', 3.0)
-                        confidence = min(pref_data.get('count', 1) / 5.0, 1.0)  # Confidence based on rating count
-                        s += (rating - 3.0) * 0.2 * confidence  # Bonus for liked foods, penalty for disliked
-
-        # 6) cooking skill adaptation bonus
-        if cooking_skill == "beginner" and any(tag in r.tags for tag in ["quick", "easy", "simple"]):
-            s += 0.5
-        elif cooking_skill == "advanced" and any(tag in r.tags for tag in ["complex", "advanced", "gourmet"]):
+            s += _preference_bonus(r)
+
+        # 4) cooking skill adaptation bonus
+        if not r.tag_set.isdisjoint(skill_set):
             s += 0.5
 
-        # 7) portion size bonus - reward recipes with specific measurements
+        # 5) portion size bonus - reward recipes with specific measurements
         portion_bonus = 0
         for ingredient in r.ingredients:
             # Check if ingredient has specific measurements (g, ml, tbsp, tsp, etc.)
@@ -160,26 +224,58 @@ def make_week_plan(
 
         return s
 
+    # Bucket recipes by meal type in one pass, so each filter only scans its own meal
+    by_meal: Dict[str, List[Recipe]] = {m: [] for m in MEAL_INDEX}
+    for r in recipes:
+        by_meal.setdefault(r.meal_type, []).append(r)
+    # Filtering only depends on the meal type, so do it once per meal rather than per day
+    pools: Dict[str, List[Recipe]] = {
+        m: filter_recipes(by_meal[m], m, include_tags, exclude_keywords) for m in ["breakfast", "lunch", "dinner"]
+    }
+    # Arrays aligned with each pool, so a day's scores are a few vector ops
+    static_scores = {m: np.array([_static_score(r, m) for r in pool], dtype=np.float64) for m, pool in pools.items()}
+    pool_proteins = {m: np.array([_protein(r) for r in pool], dtype=np.intp) for m, pool in pools.items()}
+    pool_names = {m: np.array([r.name for r in pool], dtype=object) for m, pool in pools.items()}
+    available = {m: np.ones(len(pool), dtype=bool) for m, pool in pools.items()}  # no repeated names in the week
+
+    # Add cooking skill to tags for AI generation; the same for every AI request this week
+    skill_tags = include_tags.copy() if include_tags else []
+    if cooking_skill == "beginner":
+        skill_tags.extend(["quick", "easy", "simple"])
+    elif cooking_skill == "advanced":
+        skill_tags.extend(["complex", "advanced", "gourmet"])
+
+    # Each meal type's AI request is the same all week, so send the three together rather than one by one
+    ai_requests: Dict[str, Future] = {}
+    if use_ai_expand:
+        try:
+            from ai_helpers import expand_recipe_request
+            from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+            with ThreadPoolExecutor(max_workers=len(MEAL_INDEX), initializer=add_script_run_ctx,
+                                    initargs=(None, get_script_run_ctx())) as executor:
+                ai_requests = {
+                    m: executor.submit(expand_recipe_request, m, split[MEAL_INDEX[m]], skill_tags, exclude_keywords)
+                    for m in MEAL_INDEX
+                }
+        except Exception as e:
+            print(f"[AI Expansion Error] {e}")
+
     for day in DAYS:
         day_plan: Dict[str, Optional[Recipe]] = {}
 
         for meal_type in ["breakfast", "lunch", "dinner"]:
-            # Base pool after filters
-            pool = filter_recipes(recipes, meal_type, include_tags, exclude_keywords)
-
-            # Remove already used names (global + per-meal)
-            pool = [
-                r for r in pool
-                if r.name not in used_names_global and r.name not in used_names_by_meal[meal_type]
-            ]
+            candidates = np.flatnonzero(available[meal_type])
 
             chosen: Optional[Recipe] = None
 
-            # Rank by score, then pick among top-K (variety K=5 or less)
-            if pool:
-                ranked = sorted(pool, key=lambda r: _score(r, meal_type), reverse=True)
-                K = min(5, len(ranked))
-                chosen = rng.choice(ranked[:K]) if K > 0 else None
+            # Score every candidate, then sample with softmax weights (better scores, likelier picks)
+            if candidates.size:
+                prot = pool_proteins[meal_type][candidates]
+                scores = static_scores[meal_type][candidates]
+                scores = scores - protein_count[prot] * 0.8                     # global repetition penalty
+                scores = scores - (prot == last_protein_for_meal[meal_type]) * 0.8  # same protein as yesterday
+                weights = np.exp((scores - scores.max()) / PICK_TEMPERATURE)
+                chosen = pools[meal_type][rng.choices(candidates.tolist(), weights=weights.tolist(), k=1)[0]]
 
             # Decide if we want a fresh AI recipe for variety:
             # - if none chosen, we need AI
@@ -188,35 +284,28 @@ def make_week_plan(
             if use_ai_expand and not need_ai:
                 need_ai = (rng.random() < 0.25)
 
-            if use_ai_expand and need_ai:
+            if use_ai_expand and need_ai and meal_type in ai_requests:
                 try:
-                    from ai_helpers import expand_recipe_request, save_recipe_to_json
-                    # Add cooking skill to tags for AI generation
-                    skill_tags = include_tags.copy() if include_tags else []
-                    if cooking_skill == "beginner":
-                        skill_tags.extend(["quick", "easy", "simple"])
-                    elif cooking_skill == "advanced":
-                        skill_tags.extend(["complex", "advanced", "gourmet"])
-                    
-                    ai_recipe = expand_recipe_request(meal_type, split[meal_type], skill_tags, exclude_keywords)
+                    from ai_helpers import save_recipe_to_json
+                    ai_recipe = ai_requests[meal_type].result()
                     if ai_recipe and "name" in ai_recipe:
                         # Enrich AI recipe with portion sizes
                         enriched_ai_recipe = enrich_recipe_with_portions(ai_recipe)
-                        chosen = Recipe(
-                            name=enriched_ai_recipe["name"],
-                            meal_type=meal_type,
-                            kcal=enriched_ai_recipe.get("kcal", split[meal_type]),
-                            protein=enriched_ai_recipe.get("protein", 0),
-                            carbs=enriched_ai_recipe.get("carbs", 0),
-                            fat=enriched_ai_recipe.get("fat", 0),
-                            tags=(enriched_ai_recipe.get("tags", []) or []) + ["AI"],
-                            ingredients=enriched_ai_recipe.get("ingredients", []),
-                            steps=enriched_ai_recipe.get("steps", []),
-                        )
+                        chosen = Recipe.from_dict({
+                            "name": enriched_ai_recipe["name"],
+                            "meal_type": meal_type,
+                            "kcal": enriched_ai_recipe.get("kcal", split[MEAL_INDEX[meal_type]]),
+                            "protein": enriched_ai_recipe.get("protein", 0),
+                            "carbs": enriched_ai_recipe.get("carbs", 0),
+                            "fat": enriched_ai_recipe.get("fat", 0),
+                            "tags": (enriched_ai_recipe.get("tags", []) or []) + ["AI"],
+                            "ingredients": enriched_ai_recipe.get("ingredients", []),
+                            "steps": enriched_ai_recipe.get("steps", []),
+                        })
                         if auto_save_ai:
                             # persist directly to recipes.json (function handles de-dupe)
                             try:
-                                save_recipe_to_json(chosen.model_dump(), path="recipes.json")
+                                save_recipe_to_json(asdict(chosen), path="recipes.json")
                             except Exception as e:
                                 print(f"[AI Save Warning] {e}")
                 except Exception as e:
@@ -225,10 +314,10 @@ def make_week_plan(
             day_plan[meal_type] = chosen
 
             if chosen:
-                used_names_global.add(chosen.name)
-                used_names_by_meal[meal_type].add(chosen.name)
-                prot = _main_protein(chosen)
-                protein_count[prot] = protein_count.get(prot, 0) + 1
+                for m in available:
+                    available[m] &= pool_names[m] != chosen.name
+                prot = _protein(chosen)
+                protein_count[prot] += 1
                 last_protein_for_meal[meal_type] = prot
 
         plan[day] = day_plan
@@ -239,12 +328,5 @@ def make_week_plan(
 
 def build_shopping_list(plan: Dict[str, Dict[str, Optional[Recipe]]]) -> Dict[str, int]:
     # super simple aggregation by line; you can improve with NLP units parsing later
-    counts: Dict[str, int] = {}
-    for _, meals in plan.items():
-        for meal in meals.values():
-            if not meal:
-                continue
-            for line in meal.ingredients:
-                key = line.strip()
-                counts[key] = counts.get(key, 0) + 1
-    return counts
+    lines = (line.strip() for meals in plan.values() for meal in meals.values() if meal for line in meal.ingredients)
+    return dict(Counter(lines))
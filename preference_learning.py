@@ -1,11 +1,39 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, List, Tuple, Optional
 from database import DatabaseManager
 import json
 from datetime import datetime, timedelta
 from collections import Counter
+from functools import lru_cache
+
+# Measurement words skipped when looking for an ingredient's name
+_MEASUREMENT_WORDS = frozenset({'g', 'kg', 'ml', 'l', 'tsp', 'tbsp', 'cup', 'cups', 'oz', 'lb', 'pound', 'pounds'})
+
+# Common variations of a main ingredient
+_INGREDIENT_VARIATIONS = {
+    'chicken': ['poultry', 'breast', 'thigh'],
+    'beef': ['meat', 'steak', 'ground'],
+    'fish': ['salmon', 'tuna', 'cod', 'seafood'],
+    'vegetables': ['veggies', 'veggie', 'vegetable'],
+    'cheese': ['dairy', 'mozzarella', 'cheddar', 'feta']
+}
+# (main, variant) pairs both ways round, so a variation check is one set lookup
+_VARIATION_PAIRS = frozenset(
+    pair
+    for main, variants in _INGREDIENT_VARIATIONS.items()
+    for variant in variants
+    for pair in ((main, variant), (variant, main))
+)
+
+@lru_cache(maxsize=4096)
+def _ingredient_name(ingredient: str) -> str:
+    """Main ingredient name of an ingredient line, memoized as the same recipe lines are scored on every call"""
+    lowered = ingredient.lower()
+    
+    # Return the first meaningful word, skipping measurements and numbers
+    return next((w for w in lowered.split() if w not in _MEASUREMENT_WORDS and not w.isdigit()), lowered)
 
 class PreferenceLearningSystem:
     def __init__(self, db_manager: DatabaseManager):
@@ -14,6 +42,7 @@ class PreferenceLearningSystem:
     def learn_from_rating(self, user_id: int, food_item: str, rating: int, meal_type: str = None):
         """Learn from user's food rating"""
         self.db.update_user_preferences(user_id, food_item, rating, meal_type)
+        _cached_preferences.clear()  # the new rating should count on the next rerun
         
         # Log analytics event
         self.db.log_analytics_event(
@@ -28,7 +57,10 @@ class PreferenceLearningSystem:
     
     def get_user_preferences(self, user_id: int) -> Dict:
         """Get user's learned preferences"""
-        return self.db.get_user_preferences(user_id)
+        # Session-state storage is per browser session, so it must not go through the process-wide cache
+        if not isinstance(self.db, DatabaseManager):
+            return self.db.get_user_preferences(user_id)
+        return _cached_preferences(self.db, self.db.db_path, user_id)
     
     def get_recommendations(self, user_id: int, available_recipes: List[Dict], 
                           meal_type: str = None) -> List[Dict]:
@@ -39,10 +71,15 @@ class PreferenceLearningSystem:
             return available_recipes
         
         # Score recipes based on preferences
+        ingredient_score = self._ingredient_scorer(preferences)
+        # These only depend on the preferences, so work them out once rather than per recipe
+        meal_type_prefs = self._get_meal_type_preferences(preferences)
+        tag_prefs = self._get_tag_preferences(preferences)
         scored_recipes = []
         
         for recipe in available_recipes:
-            score = self._calculate_preference_score(recipe, preferences, meal_type)
+            score = self._calculate_preference_score(recipe, preferences, meal_type, ingredient_score,
+                                                     meal_type_prefs, tag_prefs)
             scored_recipes.append((recipe, score))
         
         # Sort by score (highest first)
@@ -50,39 +87,58 @@ class PreferenceLearningSystem:
         
         return [recipe for recipe, score in scored_recipes]
     
+    def _preference_arrays(self, preferences: Dict) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Preference items with their confidence-weighted ratings and weights, as aligned arrays"""
+        items = list(preferences)
+        # Weight by confidence (more ratings = higher confidence), max weight at 5+ ratings
+        weights = np.minimum(np.array([d['count'] for d in preferences.values()], dtype=float) / 5.0, 1.0)
+        ratings = np.array([d['avg_rating'] for d in preferences.values()], dtype=float)
+        return items, ratings * weights, weights
+    
+    def _ingredient_scorer(self, preferences: Dict) -> Callable[[str], Tuple[float, float]]:
+        """Memoized (weighted rating, weight) of an ingredient name against all preferences"""
+        pref_items, pref_scores, pref_weights = self._preference_arrays(preferences)
+        scores: Dict[str, Tuple[float, float]] = {}
+        
+        def ingredient_score(name: str) -> Tuple[float, float]:
+            if name not in scores:
+                # each distinct name is matched once, then it's a dict lookup for every other recipe
+                matches = np.fromiter((self._ingredients_match(name, pref_item) for pref_item in pref_items),
+                                      dtype=bool, count=len(pref_items))
+                scores[name] = (float(matches @ pref_scores), float(matches @ pref_weights))
+            return scores[name]
+        
+        return ingredient_score
+    
     def _calculate_preference_score(self, recipe: Dict, preferences: Dict, 
-                                  meal_type: str = None) -> float:
+                                  meal_type: str = None,
+                                  ingredient_score: Optional[Callable[[str], Tuple[float, float]]] = None,
+                                  meal_type_prefs: Optional[Dict[str, float]] = None,
+                                  tag_prefs: Optional[Dict[str, float]] = None) -> float:
         """Calculate preference score for a recipe"""
         score = 0.0
         total_weight = 0
         
         # Check ingredients
-        ingredients = recipe.get('ingredients', [])
-        for ingredient in ingredients:
+        ingredient_score = ingredient_score or self._ingredient_scorer(preferences)
+        for ingredient in recipe.get('ingredients', []):
             # Extract main ingredient name (before any measurements)
-            ingredient_name = self._extract_ingredient_name(ingredient)
-            
-            # Check if we have preference data for this ingredient
-            for pref_item, pref_data in preferences.items():
-                if self._ingredients_match(ingredient_name, pref_item):
-                    rating = pref_data['avg_rating']
-                    count = pref_data['count']
-                    
-                    # Weight by confidence (more ratings = higher confidence)
-                    weight = min(count / 5.0, 1.0)  # Max weight at 5+ ratings
-                    score += rating * weight
-                    total_weight += weight
+            ingredient_rating, ingredient_weight = ingredient_score(self._extract_ingredient_name(ingredient))
+            score += ingredient_rating
+            total_weight += ingredient_weight
         
         # Check meal type preference
         if meal_type:
-            meal_type_prefs = self._get_meal_type_preferences(preferences)
+            if meal_type_prefs is None:
+                meal_type_prefs = self._get_meal_type_preferences(preferences)
             if meal_type in meal_type_prefs:
                 score += meal_type_prefs[meal_type] * 0.5
                 total_weight += 0.5
         
         # Check tags preferences
         tags = recipe.get('tags', [])
-        tag_prefs = self._get_tag_preferences(preferences)
+        if tag_prefs is None:
+            tag_prefs = self._get_tag_preferences(preferences)
         for tag in tags:
             if tag in tag_prefs:
                 score += tag_prefs[tag] * 0.3
@@ -92,18 +148,7 @@ class PreferenceLearningSystem:
     
     def _extract_ingredient_name(self, ingredient: str) -> str:
         """Extract main ingredient name from ingredient string"""
-        # Remove measurements and common words
-        words = ingredient.lower().split()
-        
-        # Remove common measurement words
-        measurement_words = {'g', 'kg', 'ml', 'l', 'tsp', 'tbsp', 'cup', 'cups', 'oz', 'lb', 'pound', 'pounds'}
-        words = [w for w in words if w not in measurement_words]
-        
-        # Remove numbers
-        words = [w for w in words if not w.isdigit()]
-        
-        # Return the first meaningful word
-        return words[0] if words else ingredient.lower()
+        return _ingredient_name(ingredient)
     
     def _ingredients_match(self, ingredient1: str, ingredient2: str) -> bool:
         """Check if two ingredients are similar"""
@@ -120,20 +165,7 @@ class PreferenceLearningSystem:
             return True
         
         # Check for common variations
-        variations = {
-            'chicken': ['poultry', 'breast', 'thigh'],
-            'beef': ['meat', 'steak', 'ground'],
-            'fish': ['salmon', 'tuna', 'cod', 'seafood'],
-            'vegetables': ['veggies', 'veggie', 'vegetable'],
-            'cheese': ['dairy', 'mozzarella', 'cheddar', 'feta']
-        }
-        
-        for main, variants in variations.items():
-            if (ingredient1 == main and ingredient2 in variants) or \
-               (ingredient2 == main and ingredient1 in variants):
-                return True
-        
-        return False
+        return (ingredient1, ingredient2) in _VARIATION_PAIRS
     
     def _get_meal_type_preferences(self, preferences: Dict) -> Dict[str, float]:
         """Extract meal type preferences from user data"""
@@ -149,7 +181,7 @@ class PreferenceLearningSystem:
                     ratings.append(pref_data['avg_rating'])
             
             if ratings:
-                meal_prefs[meal_type] = np.mean(ratings)
+                meal_prefs[meal_type] = sum(ratings) / len(ratings)
         
         return meal_prefs
     
@@ -196,6 +228,11 @@ class PreferenceLearningSystem:
             'preference_confidence': confidence
         }
 
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_preferences(_db_manager: DatabaseManager, db_path: str, user_id: int) -> Dict:
+    """A user's learned preferences, reused across reruns until the next rating"""
+    return _db_manager.get_user_preferences(user_id)
+
 def render_preference_learning_ui(user_id: int, db_manager: DatabaseManager, lang: str = "en"):
     """Render preference learning UI"""
     st.title("🍽️ Food Preferences")
@@ -1,10 +1,24 @@
 import streamlit as st
-import pandas as pd
-from typing import Dict, List, Optional
+from typing import Dict, List, Tuple
 from database import DatabaseManager
 import json
-from datetime import datetime, timedelta
-import random
+from datetime import datetime
+
+# Appends one achievement to a user's list unless they already have it
+_APPEND_ACHIEVEMENT = '''
+    UPDATE users SET achievements = json_insert(COALESCE(achievements, '[]'), '$[#]', ?)
+    WHERE id = ? AND NOT EXISTS (
+        SELECT 1 FROM json_each(COALESCE(users.achievements, '[]')) WHERE value = ?
+    )
+'''
+
+# Achievements each event can unlock, as (achievement id, meal plans generated); 0 means the event alone earns it.
+# Plans are counted per generation, not per stored plan, since regenerating a week replaces its saved plan.
+# 'nutrition_goal_met' has none yet, a protein streak needs per-day tracking first
+ACHIEVEMENT_RULES: Dict[str, Tuple[Tuple[str, int], ...]] = {
+    'meal_plan_generated': (('first_week', 1), ('meal_prep_pro', 10)),
+    'progress_shared': (('social_butterfly', 0),),
+}
 
 class SocialFeatures:
     def __init__(self, db_manager: DatabaseManager):
@@ -24,30 +38,23 @@ class SocialFeatures:
         if not user:
             return
         
+        # Only the rules for this event that the user hasn't already met
         current_achievements = set(user.achievements)
-        new_achievements = []
-        
-        # Check various achievement conditions
-        if event_type == 'meal_plan_generated':
-            # Check meal plan achievements
-            meal_plans = self.db.get_meal_plans(user_id)
-            if len(meal_plans) >= 1 and 'first_week' not in current_achievements:
-                new_achievements.append('first_week')
-            
-            if len(meal_plans) >= 10 and 'meal_prep_pro' not in current_achievements:
-                new_achievements.append('meal_prep_pro')
-        
-        elif event_type == 'nutrition_goal_met':
-            # Check nutrition achievements
-            if event_data and event_data.get('protein_goal_met'):
-                # Check for consecutive protein goal days
-                # This would require more complex tracking
-                pass
+        pending = [
+            (achievement_id, plans_needed)
+            for achievement_id, plans_needed in ACHIEVEMENT_RULES.get(event_type, ())
+            if achievement_id not in current_achievements
+        ]
+        if not pending:
+            return
         
-        elif event_type == 'progress_shared':
-            # Check social achievements
-            if 'social_butterfly' not in current_achievements:
-                new_achievements.append('social_butterfly')
+        # One count covers every threshold, and is skipped when no rule needs it
+        meal_plan_count = (
+            self.db.count_analytics_events(user_id, 'meal_plan_generated') if any(n for _, n in pending) else 0
+        )
+        new_achievements = [
+            achievement_id for achievement_id, plans_needed in pending if meal_plan_count >= plans_needed
+        ]
         
         # Award new achievements
         if new_achievements:
@@ -59,99 +66,63 @@ class SocialFeatures:
         if not user:
             return
         
-        current_achievements = user.achievements.copy()
-        current_achievements.extend(achievement_ids)
-        
-        # Update user's achievements
-        conn = self.db.db_path
-        import sqlite3
-        conn = sqlite3.connect(conn)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE users SET achievements = ? WHERE id = ?
-        ''', (json.dumps(current_achievements), user_id))
-        
-        conn.commit()
-        conn.close()
-        
-        # Log analytics event
-        self.db.log_analytics_event(
-            user_id=user_id,
-            event_type='achievement_awarded',
-            event_data={'achievements': achievement_ids}
-        )
+        # Only write (and log) achievements the user doesn't have yet, once each, in the order given
+        owned = set(user.achievements)
+        new_ids = [achievement_id for achievement_id in dict.fromkeys(achievement_ids) if achievement_id not in owned]
+        if new_ids:
+            self._award_achievements_bulk([(user_id, new_ids)])
+    
+    def _award_achievements_bulk(self, awards: List[Tuple[int, List[str]]]):
+        """Award achievements to many users in one transaction"""
+        # Append each achievement in SQL, skipping any the user already has
+        with self.db.get_connection() as conn:
+            conn.executemany(_APPEND_ACHIEVEMENT, [
+                (achievement_id, user_id, achievement_id)
+                for user_id, achievement_ids in awards
+                for achievement_id in achievement_ids
+            ])
+        
+        for user_id, achievement_ids in awards:
+            self.db.invalidate_user_cache(user_id)
+            
+            # Log analytics event (queued, the background writer inserts them in batches)
+            self.db.log_analytics_event(
+                user_id=user_id,
+                event_type='achievement_awarded',
+                event_data={'achievements': achievement_ids}
+            )
     
     def get_community_challenges(self) -> List[Dict]:
         """Get active community challenges"""
-        conn = self.db.db_path
-        import sqlite3
-        conn = sqlite3.connect(conn)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM community_challenges 
-            WHERE is_active = 1 AND end_date > datetime('now')
-            ORDER BY start_date DESC
-        ''')
-        
-        challenges = []
-        for row in cursor.fetchall():
-            challenges.append({
-                'id': row[0],
-                'name': row[1],
-                'description': row[2],
-                'start_date': datetime.fromisoformat(row[3]),
-                'end_date': datetime.fromisoformat(row[4]),
-                'participants': json.loads(row[5] or '[]'),
-                'rewards': json.loads(row[6] or '{}'),
-                'is_active': bool(row[7])
-            })
-        
-        conn.close()
-        return challenges
+        return _cached_community_challenges(self.db, self.db.db_path)
     
     def join_challenge(self, user_id: int, challenge_id: str) -> bool:
         """Join a community challenge"""
         try:
-            conn = self.db.db_path
-            import sqlite3
-            conn = sqlite3.connect(conn)
-            cursor = conn.cursor()
-            
-            # Check if user is already in challenge
-            cursor.execute('''
-                SELECT id FROM user_challenges 
-                WHERE user_id = ? AND challenge_id = ?
-            ''', (user_id, challenge_id))
-            
-            if cursor.fetchone():
-                conn.close()
-                return False  # Already joined
-            
-            # Add user to challenge
-            cursor.execute('''
-                INSERT INTO user_challenges (user_id, challenge_id, progress_data)
-                VALUES (?, ?, ?)
-            ''', (user_id, challenge_id, json.dumps({})))
-            
-            # Update challenge participants
-            cursor.execute('''
-                SELECT participants FROM community_challenges WHERE id = ?
-            ''', (challenge_id,))
-            
-            row = cursor.fetchone()
-            if row:
-                participants = json.loads(row[0] or '[]')
-                if user_id not in participants:
-                    participants.append(user_id)
-                    cursor.execute('''
-                        UPDATE community_challenges 
-                        SET participants = ? WHERE id = ?
-                    ''', (json.dumps(participants), challenge_id))
+            with self.db.get_connection() as conn:
+                cursor = conn.cursor()
+                
+                # Add user to challenge; the (user_id, challenge_id) key turns a repeat join into a no-op
+                cursor.execute('''
+                    INSERT OR IGNORE INTO user_challenges (user_id, challenge_id, progress_data)
+                    VALUES (?, ?, ?)
+                ''', (user_id, challenge_id, '{}'))
+                
+                if cursor.rowcount == 0:
+                    return False  # Already joined
+                
+                # Update challenge participants
+                cursor.execute('''
+                    UPDATE community_challenges 
+                    SET participants = json_insert(COALESCE(participants, '[]'), '$[#]', ?)
+                    WHERE id = ? AND NOT EXISTS (
+                        SELECT 1 FROM json_each(COALESCE(community_challenges.participants, '[]')) WHERE value = ?
+                    )
+                ''', (user_id, challenge_id, user_id))
             
-            conn.commit()
-            conn.close()
+            # Participant counts and the user's list both changed
+            _cached_community_challenges.clear()
+            _cached_user_challenges.clear()
             
             # Log analytics event
             self.db.log_analytics_event(
@@ -167,34 +138,7 @@ class SocialFeatures:
     
     def get_user_challenges(self, user_id: int) -> List[Dict]:
         """Get user's active challenges"""
-        conn = self.db.db_path
-        import sqlite3
-        conn = sqlite3.connect(conn)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT c.*, uc.progress_data, uc.completed
-            FROM community_challenges c
-            JOIN user_challenges uc ON c.id = uc.challenge_id
-            WHERE uc.user_id = ? AND c.is_active = 1
-        ''', (user_id,))
-        
-        challenges = []
-        for row in cursor.fetchall():
-            challenges.append({
-                'id': row[0],
-                'name': row[1],
-                'description': row[2],
-                'start_date': datetime.fromisoformat(row[3]),
-                'end_date': datetime.fromisoformat(row[4]),
-                'participants': json.loads(row[5] or '[]'),
-                'rewards': json.loads(row[6] or '{}'),
-                'progress_data': json.loads(row[8] or '{}'),
-                'completed': bool(row[9])
-            })
-        
-        conn.close()
-        return challenges
+        return _cached_user_challenges(self.db, self.db.db_path, user_id)
     
     def share_progress(self, user_id: int, progress_data: Dict) -> bool:
         """Share progress with friends"""
@@ -221,59 +165,120 @@ class SocialFeatures:
             return []
         
         friend_ids = user.friends
-        friends = []
-        
-        for friend_id in friend_ids:
-            friend = self.db.get_user_by_id(friend_id)
-            if friend:
-                friends.append({
-                    'id': friend.id,
-                    'username': friend.username,
-                    'profile_data': friend.profile_data
-                })
+        if not friend_ids:
+            return []
         
-        return friends
+        # One query for all friends rather than one per friend
+        placeholders = ','.join('?' * len(friend_ids))
+        with self.db.get_connection() as conn:
+            rows = {
+                row[0]: row for row in conn.execute(
+                    f'SELECT id, username, profile_data FROM users WHERE id IN ({placeholders})',
+                    friend_ids
+                )
+            }
+        
+        # Keep the order friends were added in
+        return [
+            {
+                'id': rows[friend_id][0],
+                'username': rows[friend_id][1],
+                'profile_data': json.loads(rows[friend_id][2] or '{}')
+            }
+            for friend_id in friend_ids if friend_id in rows
+        ]
     
     def add_friend(self, user_id: int, friend_username: str) -> bool:
         """Add a friend by username"""
         try:
-            # Find friend by username
-            conn = self.db.db_path
-            import sqlite3
-            conn = sqlite3.connect(conn)
-            cursor = conn.cursor()
-            
-            cursor.execute('SELECT id FROM users WHERE username = ?', (friend_username,))
-            friend_row = cursor.fetchone()
-            
-            if not friend_row:
-                conn.close()
-                return False
-            
-            friend_id = friend_row[0]
-            
-            # Add friend to user's friends list
+            # Looked up before borrowing a connection, so this never holds two at once
             user = self.db.get_user_by_id(user_id)
             if not user:
-                conn.close()
                 return False
             
-            current_friends = user.friends.copy()
-            if friend_id not in current_friends:
-                current_friends.append(friend_id)
+            with self.db.get_connection() as conn:
+                cursor = conn.cursor()
                 
-                cursor.execute('''
-                    UPDATE users SET friends = ? WHERE id = ?
-                ''', (json.dumps(current_friends), user_id))
+                # Find friend by username
+                cursor.execute('SELECT id FROM users WHERE username = ?', (friend_username,))
+                friend_row = cursor.fetchone()
+                
+                if not friend_row:
+                    return False
                 
-                conn.commit()
+                friend_id = friend_row[0]
+                
+                # Friendship is mutual: add each to the other's list (unless already there) in one transaction
+                cursor.executemany('''
+                    UPDATE users SET friends = json_insert(COALESCE(friends, '[]'), '$[#]', ?)
+                    WHERE id = ? AND NOT EXISTS (
+                        SELECT 1 FROM json_each(COALESCE(users.friends, '[]')) WHERE value = ?
+                    )
+                ''', [(friend_id, user_id, friend_id), (user_id, friend_id, user_id)])
+                added = cursor.rowcount > 0
             
-            conn.close()
+            if added:
+                self.db.invalidate_user_cache(user_id)
+                self.db.invalidate_user_cache(friend_id)
             return True
         except Exception as e:
             st.error(f"Failed to add friend: {str(e)}")
             return False
 
+@st.cache_data(ttl=30, show_spinner=False)
+def _cached_community_challenges(_db_manager: DatabaseManager, db_path: str) -> List[Dict]:
+    """Active community challenges, reused across reruns until someone joins one"""
+    with _db_manager.get_connection() as conn:
+        cursor = conn.execute('''
+            SELECT id, name, description, start_date, end_date, participants, rewards, is_active
+            FROM community_challenges 
+            WHERE is_active = 1 AND end_date > datetime('now')
+            ORDER BY start_date DESC
+        ''')
+        
+        # Build straight from the cursor rather than a fetchall() copy
+        return [
+            {
+                'id': row['id'],
+                'name': row['name'],
+                'description': row['description'],
+                'start_date': datetime.fromisoformat(row['start_date']),
+                'end_date': datetime.fromisoformat(row['end_date']),
+                'participants': json.loads(row['participants'] or '[]'),
+                'rewards': json.loads(row['rewards'] or '{}'),
+                'is_active': bool(row['is_active'])
+            }
+            for row in cursor
+        ]
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _cached_user_challenges(_db_manager: DatabaseManager, db_path: str, user_id: int) -> List[Dict]:
+    """A user's active challenges, reused across reruns until they join another"""
+    with _db_manager.get_connection() as conn:
+        cursor = conn.execute('''
+            SELECT c.id, c.name, c.description, c.start_date, c.end_date, c.participants, c.rewards,
+                   uc.progress_data, uc.completed
+            FROM community_challenges c
+            JOIN user_challenges uc ON c.id = uc.challenge_id
+            WHERE uc.user_id = ? AND c.is_active = 1
+        ''', (user_id,))
+        
+        # Build straight from the cursor rather than a fetchall() copy
+        return [
+            {
+                'id': row['id'],
+                'name': row['name'],
+                'description': row['description'],
+                'start_date': datetime.fromisoformat(row['start_date']),
+                'end_date': datetime.fromisoformat(row['end_date']),
+                'participants': json.loads(row['participants'] or '[]'),
+                'rewards': json.loads(row['rewards'] or '{}'),
+                'progress_data': json.loads(row['progress_data'] or '{}'),
+                'completed': bool(row['completed'])
+            }
+            for row in cursor
+        ]
+
 def render_social_features_ui(user_id: int, db_manager: DatabaseManager, lang: str = "en"):
     """Render social features UI"""
     st.title("👥 Social Features")
@@ -382,15 +387,11 @@ def render_social_features_ui(user_id: int, db_manager: DatabaseManager, lang: s
             
             # Show plan summary
             plan_data = plan['plan_data']
-            total_calories = 0
-            
-            for day, meals in plan_data.items():
-                if isinstance(meals, dict):
-                    day_calories = sum(
-                        recipe.get('kcal', 0) for recipe in meals.values() 
-                        if recipe and isinstance(recipe, dict)
-                    )
-                    total_calories += day_calories
+            total_calories = sum(
+                recipe.get('kcal', 0)
+                for meals in plan_data.values() if isinstance(meals, dict)
+                for recipe in meals.values() if recipe and isinstance(recipe, dict)
+            )
             
             st.write(f"Total weekly calories: {total_calories:,}")
             